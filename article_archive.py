@@ -0,0 +1,390 @@
+import os
+import re
+import sys
+import mmap
+import zlib
+import hashlib
+import struct
+import logging
+import threading
+from persistence import get_article_restorer, write_file_atomically
+
+logger = logging.getLogger('article_archive')
+
+RECORD_MAGIC = b'LPA1'
+RECORD_HEADER = struct.Struct('<4sII')  # 魔数、文章ID、压缩后长度
+INDEX_ENTRY = struct.Struct('<IQ')  # 文章ID、记录偏移
+ARCHIVE_NAME = 'articles.pack'
+INDEX_NAME = 'articles.idx'
+
+
+def read_record(data, offset):
+    """从offset处读取一条记录，返回(文章ID, 压缩数据, 下一条记录偏移)"""
+    magic, article_id, length = RECORD_HEADER.unpack_from(data, offset)
+    if magic != RECORD_MAGIC:
+        raise ValueError(f"归档记录损坏，偏移: {offset}")
+    start = offset + RECORD_HEADER.size
+    return article_id, data[start:start + length], start + length
+
+
+def scan_archive(archive_path):
+    """按写入顺序遍历归档文件中的所有记录，返回(文章ID, 偏移, 压缩数据)"""
+    if not os.path.exists(archive_path) or os.path.getsize(archive_path) == 0:
+        return
+
+    # 使用独立的mmap，避免与随机读取的映射相互影响
+    with open(archive_path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            offset = 0
+            while offset + RECORD_HEADER.size <= len(data):
+                try:
+                    article_id, payload, next_offset = read_record(data, offset)
+                except (ValueError, struct.error) as e:
+                    # 末尾不完整的记录（写入中断）直接忽略
+                    logger.warning(f"扫描归档时遇到无效记录: {str(e)}")
+                    return
+                if next_offset > len(data):
+                    return
+                yield article_id, offset, bytes(payload)
+                offset = next_offset
+
+
+class ArticleArchive:
+    """
+    打包压缩的文章归档：所有文章以追加方式写入单个归档文件，每条记录单独压缩，
+    旁路索引文件保存文章ID到记录偏移的映射，通过mmap随机读取
+    """
+    def __init__(self, articles_dir='latepost_articles'):
+        """初始化文章归档"""
+        self.articles_dir = articles_dir
+        self.archive_path = os.path.join(articles_dir, ARCHIVE_NAME)
+        self.index_path = os.path.join(articles_dir, INDEX_NAME)
+        self.lock = threading.Lock()
+        self.offsets = {}
+        self._index_size = 0  # 已加载的索引文件长度，用于增量读取其他实例追加的索引项
+        self._mmap = None
+        self._mmap_size = 0
+        self.restorer = get_article_restorer(articles_dir)
+
+        if not os.path.exists(articles_dir):
+            os.makedirs(articles_dir)
+
+        self._load_index()
+
+    def _load_index(self):
+        """加载ID到偏移的索引，索引缺失或损坏时通过扫描归档重建"""
+        self.offsets = {}
+        self._index_size = 0
+        if not os.path.exists(self.archive_path):
+            return
+
+        archive_size = os.path.getsize(self.archive_path)
+        index_valid = os.path.exists(self.index_path) and os.path.getsize(self.index_path) % INDEX_ENTRY.size == 0
+        if index_valid:
+            with open(self.index_path, 'rb') as f:
+                data = f.read()
+            for article_id, offset in INDEX_ENTRY.iter_unpack(data):
+                if offset >= archive_size:
+                    index_valid = False
+                    break
+                # 同一ID多次写入时以最后一次为准
+                self.offsets[article_id] = offset
+
+        if not index_valid:
+            logger.warning("文章索引缺失或损坏，扫描归档重建索引")
+            self._rebuild_index()
+            return
+
+        self._index_size = os.path.getsize(self.index_path)
+
+    def _rebuild_index(self):
+        """扫描归档重建索引并原子写入，调用方需持有锁"""
+        self.offsets = {article_id: offset for article_id, offset, _ in self._scan_records()}
+        write_file_atomically(self.index_path, b''.join(
+            INDEX_ENTRY.pack(article_id, offset) for article_id, offset in self.offsets.items()))
+        self._index_size = os.path.getsize(self.index_path)
+        # 归档可能已被替换为同样大小的文件，重新映射
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+            self._mmap_size = 0
+
+    def _refresh_index(self):
+        """读取索引文件中新追加的索引项（如其他进程写入的文章），调用方需持有锁"""
+        if not os.path.exists(self.index_path):
+            return
+        index_size = os.path.getsize(self.index_path)
+        if index_size < self._index_size:
+            # 索引被替换（如从Git仓库恢复），重新加载
+            self._load_index()
+            return
+        if index_size == self._index_size:
+            return
+
+        archive_size = os.path.getsize(self.archive_path) if os.path.exists(self.archive_path) else 0
+        with open(self.index_path, 'rb') as f:
+            f.seek(self._index_size)
+            data = f.read(index_size - self._index_size)
+        usable = len(data) - len(data) % INDEX_ENTRY.size
+        for article_id, offset in INDEX_ENTRY.iter_unpack(data[:usable]):
+            if offset < archive_size:
+                self.offsets[article_id] = offset
+        self._index_size += usable
+
+    def _ensure_restored(self):
+        """首次写入或读取缺失文章时从Git仓库恢复归档，恢复后重新加载索引"""
+        if self.restorer.ensure_restored():
+            with self.lock:
+                # 归档文件已被原子替换，丢弃旧文件的映射
+                if self._mmap is not None:
+                    self._mmap.close()
+                    self._mmap = None
+                    self._mmap_size = 0
+                self._load_index()
+
+    def _get_mmap(self):
+        """返回覆盖当前归档文件的mmap，归档增长后重新映射，调用方需持有锁"""
+        size = os.path.getsize(self.archive_path) if os.path.exists(self.archive_path) else 0
+        if size == 0:
+            return None
+        if self._mmap is None or self._mmap_size != size:
+            if self._mmap is not None:
+                self._mmap.close()
+            with open(self.archive_path, 'rb') as f:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._mmap_size = size
+        return self._mmap
+
+    def _read_record(self, data, offset):
+        """从offset处读取一条记录，返回(文章ID, 压缩数据, 下一条记录偏移)"""
+        return read_record(data, offset)
+
+    def _read_article(self, article_id, offset):
+        """读取offset处的记录并确认属于该文章，记录无效或ID不符时返回None，调用方需持有锁"""
+        data = self._get_mmap()
+        if data is None:
+            return None
+        try:
+            record_id, payload, next_offset = self._read_record(data, offset)
+        except (ValueError, struct.error):
+            return None
+        if record_id != article_id or next_offset > len(data):
+            return None
+        return bytes(payload)
+
+    def _scan_records(self):
+        """按写入顺序遍历归档中的所有记录，返回(文章ID, 偏移, 压缩数据)"""
+        return scan_archive(self.archive_path)
+
+    def __contains__(self, article_id):
+        return int(article_id) in self.offsets
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def ids(self):
+        """返回归档中的所有文章ID（升序）"""
+        return sorted(self.offsets)
+
+    def put(self, article_id, markdown_content):
+        """追加写入一篇文章"""
+        article_id = int(article_id)
+        payload = zlib.compress(markdown_content.encode('utf-8'), 6)
+
+        # 先恢复远程归档再追加，避免推送时用本地较小的归档覆盖远程
+        self._ensure_restored()
+
+        with self.lock:
+            with open(self.archive_path, 'ab') as f:
+                offset = f.tell()
+                f.write(RECORD_HEADER.pack(RECORD_MAGIC, article_id, len(payload)))
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            # 先写归档再写索引，中断时最多丢失索引项，加载时可重建
+            with open(self.index_path, 'ab') as f:
+                f.write(INDEX_ENTRY.pack(article_id, offset))
+            self.offsets[article_id] = offset
+
+    def get(self, article_id):
+        """按ID读取文章Markdown内容，不存在时返回None"""
+        offset = self.offsets.get(int(article_id))
+        if offset is None:
+            # 先读取其他实例新写入的索引项，仍然没有时再从Git仓库恢复
+            with self.lock:
+                self._refresh_index()
+                offset = self.offsets.get(int(article_id))
+        if offset is None:
+            self._ensure_restored()
+            offset = self.offsets.get(int(article_id))
+        if offset is None:
+            return None
+        with self.lock:
+            payload = self._read_article(int(article_id), offset)
+            if payload is None:
+                # 索引与归档不一致（如归档被替换），重建索引后重试一次
+                logger.warning(f"文章{article_id}的索引项与归档记录不符，扫描归档重建索引")
+                self._rebuild_index()
+                offset = self.offsets.get(int(article_id))
+                if offset is not None:
+                    payload = self._read_article(int(article_id), offset)
+        if payload is None:
+            return None
+        return zlib.decompress(payload).decode('utf-8')
+
+    def iter_articles(self):
+        """顺序扫描归档，按写入顺序返回每篇文章的最新版本(文章ID, Markdown内容)"""
+        with self.lock:
+            self._refresh_index()
+        for article_id, offset, payload in self._scan_records():
+            # 跳过已被后续写入覆盖的旧版本
+            if self.offsets.get(article_id) != offset:
+                continue
+            yield article_id, zlib.decompress(payload).decode('utf-8')
+
+    def import_markdown_files(self, source_dir=None):
+        """将目录中的latepost_article_{id}.md文件导入归档，返回导入数量"""
+        source_dir = source_dir or self.articles_dir
+        imported = 0
+        for filename in sorted(os.listdir(source_dir)):
+            match = re.match(r'latepost_article_(\d+)\.md$', filename)
+            if not match or int(match.group(1)) in self:
+                continue
+            with open(os.path.join(source_dir, filename), 'r', encoding='utf-8') as f:
+                self.put(int(match.group(1)), f.read())
+            imported += 1
+        logger.info(f"导入了{imported}篇Markdown文章到归档")
+        return imported
+
+    def export_markdown_files(self, output_dir):
+        """将归档中的文章导出为单独的Markdown文件，返回导出数量"""
+        if not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+        exported = 0
+        for article_id, content in self.iter_articles():
+            with open(os.path.join(output_dir, f"latepost_article_{article_id}.md"), 'w', encoding='utf-8') as f:
+                f.write(content)
+            exported += 1
+        logger.info(f"导出了{exported}篇文章到: {output_dir}")
+        return exported
+
+
+_archives = {}
+_archives_lock = threading.Lock()
+
+
+def get_article_archive(articles_dir='latepost_articles'):
+    """返回文章目录对应的归档，同一目录在进程内共用一个实例，写入后其他模块立即可读"""
+    key = os.path.abspath(articles_dir)
+    with _archives_lock:
+        if key not in _archives:
+            _archives[key] = ArticleArchive(articles_dir)
+        return _archives[key]
+
+
+def merge_remote_archive(articles_dir, remote_dir):
+    """
+    将远程仓库中的归档与本地归档合并，归档和索引作为一个整体处理
+
+    以远程归档的记录为基础，追加本地独有的记录（如恢复失败期间写入的文章），
+    推送时远程不会丢失记录；合并结果写入临时文件后原子替换，索引按合并后的归档重新生成
+
+    Returns:
+        本地归档是否发生变化
+    """
+    remote_path = os.path.join(remote_dir, ARCHIVE_NAME)
+    if not os.path.exists(remote_path):
+        return False
+    archive_path = os.path.join(articles_dir, ARCHIVE_NAME)
+    index_path = os.path.join(articles_dir, INDEX_NAME)
+
+    def record_key(article_id, payload):
+        return article_id, hashlib.sha256(payload).digest()
+
+    remote_records = [(article_id, payload) for article_id, _, payload in scan_archive(remote_path)]
+    remote_keys = {record_key(article_id, payload) for article_id, payload in remote_records}
+    local_records = [(article_id, payload) for article_id, _, payload in scan_archive(archive_path)]
+    local_keys = {record_key(article_id, payload) for article_id, payload in local_records}
+
+    # 本地已包含远程的全部记录，无需合并
+    if remote_keys <= local_keys:
+        return False
+
+    merged = remote_records + [
+        (article_id, payload) for article_id, payload in local_records
+        if record_key(article_id, payload) not in remote_keys
+    ]
+    index_entries = []
+
+    def write_archive(f):
+        for article_id, payload in merged:
+            index_entries.append(INDEX_ENTRY.pack(article_id, f.tell()))
+            f.write(RECORD_HEADER.pack(RECORD_MAGIC, article_id, len(payload)))
+            f.write(payload)
+
+    os.makedirs(articles_dir, exist_ok=True)
+    write_file_atomically(archive_path, write_archive)
+    write_file_atomically(index_path, b''.join(index_entries))
+    logger.info(f"合并远程归档: 远程{len(remote_records)}条记录，追加本地独有记录"
+                f"{len(merged) - len(remote_records)}条")
+    return True
+
+
+def use_packed_storage():
+    """是否启用打包归档存储（环境变量ARTICLE_STORAGE=pack）"""
+    return os.environ.get('ARTICLE_STORAGE', 'markdown').lower() == 'pack'
+
+
+def load_article_markdown(articles_dir, article_id, archive=None):
+    """读取文章Markdown内容，优先从打包归档读取，其次读取单独的Markdown文件，
+    都不存在时从Git仓库恢复文章目录后再试一次"""
+    article_path = os.path.join(articles_dir, f"latepost_article_{article_id}.md")
+
+    for attempt in range(2):
+        if archive is None and os.path.exists(os.path.join(articles_dir, ARCHIVE_NAME)):
+            archive = get_article_archive(articles_dir)
+        if archive is not None:
+            content = archive.get(article_id)
+            if content is not None:
+                return content
+
+        if os.path.exists(article_path):
+            with open(article_path, 'r', encoding='utf-8') as f:
+                return f.read()
+
+        if attempt == 0 and not get_article_restorer(articles_dir).ensure_restored():
+            break
+
+    return None
+
+
+def article_storage_files(articles_dir, article_ids):
+    """返回保存指定文章所涉及的本地文件，用于增量同步到Git仓库"""
+    paths = []
+    # 归档在与远程合并之前可能缺少远程的记录，此时推送会覆盖远程的完整归档
+    if os.path.exists(os.path.join(articles_dir, ARCHIVE_NAME)) and get_article_restorer(articles_dir).restored:
+        paths += [os.path.join(articles_dir, ARCHIVE_NAME), os.path.join(articles_dir, INDEX_NAME)]
+    for article_id in article_ids:
+        article_path = os.path.join(articles_dir, f"latepost_article_{article_id}.md")
+        if os.path.exists(article_path):
+            paths.append(article_path)
+    return [path for path in paths if os.path.exists(path)]
+
+
+if __name__ == "__main__":
+    from logging_config import configure_logging
+    configure_logging()
+
+    # 用法: python article_archive.py import [目录] | export <输出目录>
+    if len(sys.argv) < 2 or sys.argv[1] not in ('import', 'export'):
+        print("用法: python article_archive.py import [文章目录] | export <输出目录>")
+        sys.exit(1)
+
+    archive = ArticleArchive()
+    if sys.argv[1] == 'import':
+        archive.import_markdown_files(sys.argv[2] if len(sys.argv) > 2 else None)
+    else:
+        if len(sys.argv) < 3:
+            print("请指定导出目录")
+            sys.exit(1)
+        archive.export_markdown_files(sys.argv[2])
@@ -0,0 +1,126 @@
+import os
+import hashlib
+import logging
+import threading
+import xml.etree.ElementTree as ET
+from collections import OrderedDict
+
+logger = logging.getLogger('delta_feed')
+
+ET.register_namespace('atom', 'http://www.w3.org/2005/Atom')
+
+
+class FeedHistory:
+    """
+    保留最近若干个feed版本（以ETag为键），用于支持RFC 3229+feed增量响应：
+    客户端携带上次的ETag并声明A-IM: feed时，只返回之后新增的条目
+    """
+    def __init__(self, feed_path='feed.xml', max_versions=20, max_deltas=50):
+        """
+        初始化feed版本历史
+
+        Args:
+            feed_path: feed.xml文件路径
+            max_versions: 保留的历史版本数量
+            max_deltas: 缓存的增量响应数量
+        """
+        self.feed_path = feed_path
+        self.max_versions = max_versions
+        self.max_deltas = max_deltas
+        self.lock = threading.Lock()
+        self.versions = OrderedDict()  # ETag -> 该版本中条目GUID到条目内容哈希的映射
+        self.deltas = OrderedDict()  # (基准ETag, 当前ETag) -> 增量内容
+        self._stat = None
+        self._etag = None
+        self._content = None
+
+    def _item_key(self, item):
+        """返回条目的唯一标识，优先使用guid，其次使用link"""
+        for tag in ('guid', 'link'):
+            elem = item.find(tag)
+            if elem is not None and elem.text:
+                return elem.text.strip()
+        return ET.tostring(item)
+
+    def _item_hash(self, item):
+        """计算条目内容哈希，用于识别被编辑过的条目"""
+        return hashlib.sha256(ET.tostring(item)).hexdigest()
+
+    def current(self):
+        """返回当前feed的(ETag, 内容)，文件变化时重新计算并记录新版本"""
+        stat = os.stat(self.feed_path)
+        stat_key = (stat.st_mtime_ns, stat.st_size)
+
+        with self.lock:
+            if stat_key == self._stat:
+                return self._etag, self._content
+
+            with open(self.feed_path, 'rb') as f:
+                content = f.read()
+            etag = hashlib.sha256(content).hexdigest()[:32]
+
+            if etag not in self.versions:
+                try:
+                    root = ET.fromstring(content)
+                    items = {self._item_key(item): self._item_hash(item) for item in root.iter('item')}
+                except ET.ParseError as e:
+                    # 无法解析的版本仍然可以完整提供，只是不能作为增量的基准
+                    logger.warning(f"解析feed版本失败: {str(e)}")
+                    items = None
+                self.versions[etag] = items
+                while len(self.versions) > self.max_versions:
+                    self.versions.popitem(last=False)
+                logger.info(f"记录新的feed版本: {etag}")
+
+            self._stat, self._etag, self._content = stat_key, etag, content
+            return etag, content
+
+    def delta(self, base_etags, current=None):
+        """
+        计算相对于客户端已有版本的增量feed
+
+        Args:
+            base_etags: 客户端If-None-Match中的ETag集合
+            current: 调用方已读取的(ETag, 内容)，保证增量与响应的ETag对应同一版本
+
+        Returns:
+            (基准ETag, 增量内容)；没有可用的历史版本时返回(None, None)
+        """
+        etag, content = current or self.current()
+
+        with self.lock:
+            if self.versions.get(etag) is None:
+                return None, None
+            base_etag = next((tag for tag in base_etags
+                              if self.versions.get(tag) is not None and tag != etag), None)
+            if base_etag is None:
+                return None, None
+
+            cache_key = (base_etag, etag)
+            if cache_key in self.deltas:
+                self.deltas.move_to_end(cache_key)
+                return base_etag, self.deltas[cache_key]
+
+            known_items = self.versions[base_etag]
+
+        # 只保留客户端版本中不存在或内容已变化的条目
+        root = ET.fromstring(content)
+        channel = root.find('channel')
+        for item in channel.findall('item'):
+            if known_items.get(self._item_key(item)) == self._item_hash(item):
+                channel.remove(item)
+        delta_content = ET.tostring(root, encoding='utf-8', xml_declaration=True)
+
+        with self.lock:
+            self.deltas[cache_key] = delta_content
+            while len(self.deltas) > self.max_deltas:
+                self.deltas.popitem(last=False)
+
+        return base_etag, delta_content
+
+
+def accepts_feed_delta(a_im_header):
+    """判断A-IM请求头是否声明支持feed实例操作"""
+    if not a_im_header:
+        return False
+    return any(part.split(';')[0].strip().lower() == 'feed' for part in a_im_header.split(','))
@@ -2,10 +2,8 @@ import os
 import logging
 import xml.etree.ElementTree as ET
 from datetime import datetime
-from persistence import GitRepository, compare_feed_dates
+from persistence import GitRepository, compare_feed_dates, write_file_atomically
 
-# 配置日志
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger('feed_initializer')
 
 class FeedInitializer:
@@ -16,40 +14,43 @@ class FeedInitializer:
         self.feed_path = feed_path
         self.git_repo = GitRepository()
     
-    def initialize_feed(self):
-        """初始化feed.xml文件，比较本地和远程仓库中的时间戳，选择较新的作为初始文件"""
-        logger.info("开始初始化feed.xml文件")
+    def initialize_feed(self, remote_feed_content=None):
+        """
+        初始化feed文件，比较本地和远程仓库中的时间戳，选择较新的作为初始文件
         
-        # 检查本地feed.xml是否存在
+        Args:
+            remote_feed_content: 已获取的远程feed内容，为None时从远程仓库获取
+        """
+        logger.info(f"开始初始化feed文件: {self.feed_path}")
+        
+        if remote_feed_content is None:
+            remote_feed_content = self.git_repo.get_remote_feed(self.feed_path)
+        
+        # 检查本地feed文件是否存在
         if not os.path.exists(self.feed_path):
-            logger.warning(f"本地feed.xml不存在: {self.feed_path}")
-            # 尝试从远程仓库获取
-            remote_feed_content = self.git_repo.get_remote_feed()
+            logger.warning(f"本地feed文件不存在: {self.feed_path}")
+            # 使用远程仓库中的版本
             if remote_feed_content:
-                logger.info("从远程仓库获取feed.xml成功")
-                with open(self.feed_path, 'w', encoding='utf-8') as f:
-                    f.write(remote_feed_content)
+                logger.info(f"从远程仓库获取{self.feed_path}成功")
+                write_file_atomically(self.feed_path, remote_feed_content.encode('utf-8'))
                 return True
             else:
-                logger.error("无法获取feed.xml，初始化失败")
+                logger.error(f"无法获取{self.feed_path}，初始化失败")
                 return False
         
-        # 从远程仓库获取feed.xml
-        remote_feed_content = self.git_repo.get_remote_feed()
         if not remote_feed_content:
-            logger.warning("无法从远程仓库获取feed.xml，使用本地版本")
+            logger.warning(f"无法从远程仓库获取{self.feed_path}，使用本地版本")
             return True
         
-        # 比较本地和远程feed.xml的lastBuildDate
+        # 比较本地和远程feed的lastBuildDate
         source, content = compare_feed_dates(self.feed_path, remote_feed_content)
         
         # 如果远程版本更新，则使用远程版本
         if source == 'remote' and content:
-            logger.info("使用远程仓库中的feed.xml")
-            with open(self.feed_path, 'w', encoding='utf-8') as f:
-                f.write(content)
+            logger.info(f"使用远程仓库中的{self.feed_path}")
+            write_file_atomically(self.feed_path, content.encode('utf-8'))
         else:
-            logger.info("使用本地feed.xml")
+            logger.info(f"使用本地{self.feed_path}")
         
         return True
 
@@ -58,5 +59,25 @@ def initialize_feed():
     initializer = FeedInitializer()
     return initializer.initialize_feed()
 
+def initialize_feeds(feed_paths):
+    """
+    初始化多个来源的feed文件，只克隆一次仓库
+    
+    Args:
+        feed_paths: feed文件路径列表
+    
+    Returns:
+        初始化成功的feed路径集合
+    """
+    remote_feeds = GitRepository().get_remote_feeds(feed_paths)
+    initialized = set()
+    for feed_path in feed_paths:
+        # 远程缺少该文件时传入空字符串，避免再次克隆
+        if FeedInitializer(feed_path).initialize_feed(remote_feeds.get(feed_path, '')):
+            initialized.add(feed_path)
+    return initialized
+
 if __name__ == "__main__":
+    from logging_config import configure_logging
+    configure_logging()
     initialize_feed()
\ No newline at end of file
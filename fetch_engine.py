@@ -0,0 +1,76 @@
+import time
+import random
+import logging
+import threading
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger('fetch_engine')
+
+
+class FetchEngine:
+    """
+    所有来源共用的并发抓取引擎：共享一个连接池和线程池，
+    对同一主机的请求保持随机间隔，不同主机之间可以并发
+    """
+    def __init__(self, max_workers=4, host_interval=(2, 5), timeout=15):
+        """
+        初始化抓取引擎
+
+        Args:
+            max_workers: 最大并发请求数
+            host_interval: 同一主机两次请求之间的随机间隔范围（秒）
+            timeout: 请求超时时间（秒）
+        """
+        self.max_workers = max_workers
+        self.host_interval = host_interval
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='fetch')
+        self.lock = threading.Lock()
+        self.next_allowed = {}  # 主机 -> 下一次允许请求的时间
+        self.session = None
+
+    def _get_session(self):
+        """获取共享连接池的HTTP客户端，首次调用时才导入requests"""
+        with self.lock:
+            if self.session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                self.session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=self.max_workers, pool_maxsize=self.max_workers)
+                self.session.mount('http://', adapter)
+                self.session.mount('https://', adapter)
+            return self.session
+
+    def _wait_for_host(self, host):
+        """等待到允许请求该主机的时间，模拟人类行为并减轻目标网站压力"""
+        with self.lock:
+            now = time.monotonic()
+            scheduled = max(now, self.next_allowed.get(host, now))
+            self.next_allowed[host] = scheduled + random.uniform(*self.host_interval)
+        if scheduled > now:
+            time.sleep(scheduled - now)
+
+    def fetch(self, url, headers=None):
+        """按主机限速后发送GET请求，返回响应对象"""
+        session = self._get_session()
+        self._wait_for_host(urlparse(url).netloc)
+        return session.get(url, headers=headers, timeout=self.timeout)
+
+    def map(self, func, items):
+        """在共享线程池中并发执行func，按输入顺序返回结果"""
+        return list(self.executor.map(func, items))
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_fetch_engine():
+    """返回进程内共享的抓取引擎"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = FetchEngine()
+        return _engine
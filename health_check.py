@@ -1,26 +1,35 @@
 import os
 import time
+import logging
 import threading
-import requests
 from datetime import datetime
+from logging_config import log_fields
+
+logger = logging.getLogger('health_check')
 
 class HealthCheck:
     """
     健康检查和自动恢复模块，用于解决Render免费服务的503问题
     """
-    def __init__(self, app, check_interval=300):
+    def __init__(self, app, check_interval=300, watchdog=None, ping_timeout=(3, 10)):
         """
         初始化健康检查模块
         
         Args:
             app: Flask应用实例
             check_interval: 健康检查间隔（秒），默认5分钟
+            watchdog: RSS更新线程的看门狗，用于报告组件存活状态
+            ping_timeout: 自我ping的(连接, 读取)超时时间（秒）
         """
         self.app = app
         self.check_interval = check_interval
+        self.watchdog = watchdog
+        self.ping_timeout = ping_timeout
         self.last_check_time = None
         self.service_url = os.environ.get('SERVICE_URL', 'http://localhost:5000')
         self.is_running = False
+        
+        self.session = None  # 复用连接的HTTP客户端，首次ping时创建
     
     def add_health_endpoints(self):
         """
@@ -29,17 +38,40 @@ class HealthCheck:
         @self.app.route('/health')
         def health_check():
             self.last_check_time = datetime.now()
-            return {
+            result = {
                 'status': 'ok',
                 'timestamp': self.last_check_time.isoformat(),
                 'uptime': self._get_uptime()
             }
+            if self.watchdog is None:
+                return result
+            
+            # RSS更新线程卡住时返回503，便于托管平台发现并重启
+            update_status = self.watchdog.status()
+            result['update'] = update_status
+            if not update_status['healthy']:
+                result['status'] = 'degraded'
+                return result, 503
+            return result
         
         @self.app.route('/ping')
         def ping():
             self.last_check_time = datetime.now()
             return 'pong'
     
+    def _get_session(self):
+        """
+        获取复用连接的HTTP客户端，首次调用时才导入requests，缩短服务启动时间
+        """
+        if self.session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            
+            self.session = requests.Session()
+            self.session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=1))
+            self.session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        return self.session
+    
     def _get_uptime(self):
         """
         获取服务运行时间
@@ -77,13 +109,16 @@ class HealthCheck:
                             continue
                     
                     # 执行自我ping
-                    response = requests.get(f"{self.service_url}/ping")
+                    ping_start = time.perf_counter()
+                    response = self._get_session().get(f"{self.service_url}/ping", timeout=self.ping_timeout)
+                    duration = time.perf_counter() - ping_start
                     if response.status_code == 200:
-                        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 自我健康检查成功")
+                        logger.info("自我健康检查成功", extra=log_fields(stage='ping', duration=duration, sampled=True))
                     else:
-                        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 自我健康检查失败: {response.status_code}")
+                        logger.warning(f"自我健康检查失败: {response.status_code}",
+                                       extra=log_fields(stage='ping', duration=duration))
                 except Exception as e:
-                    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 自我健康检查异常: {str(e)}")
+                    logger.warning(f"自我健康检查异常: {str(e)}", extra=log_fields(stage='ping'))
                 
                 # 等待下一次检查
                 time.sleep(self.check_interval)
@@ -92,20 +127,21 @@ class HealthCheck:
         health_thread = threading.Thread(target=ping_worker)
         health_thread.daemon = True
         health_thread.start()
-        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 健康检查服务已启动，间隔: {self.check_interval}秒")
+        logger.info(f"健康检查服务已启动，间隔: {self.check_interval}秒")
 
-def setup_health_check(app, check_interval=300):
+def setup_health_check(app, check_interval=300, watchdog=None):
     """
     设置健康检查，在主应用中调用此函数
     
     Args:
         app: Flask应用实例
         check_interval: 健康检查间隔（秒）
+        watchdog: RSS更新线程的看门狗（可选）
     
     Returns:
         HealthCheck实例
     """
-    health_check = HealthCheck(app, check_interval)
+    health_check = HealthCheck(app, check_interval, watchdog=watchdog)
     health_check.add_health_endpoints()
     health_check.start_self_ping()
     return health_check
\ No newline at end of file
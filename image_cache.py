@@ -0,0 +1,282 @@
+import os
+import re
+import io
+import json
+import hashlib
+import logging
+import threading
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger('image_cache')
+
+IMAGE_PATTERN = re.compile(r'!\[[^\]]*\]\(([^)\s]+)\)')
+HASH_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+
+class ImageCache:
+    """
+    文章图片缓存和代理：后台下载文章图片，按内容哈希存储在容量有限的LRU磁盘缓存中，
+    生成压缩后的缩略图，并通过本地/img/<hash>端点提供长缓存的图片访问
+    """
+    def __init__(self, app, cache_dir='image_cache', max_bytes=200 * 1024 * 1024,
+                 thumbnail_width=800, max_workers=4, request_timeout=15, max_image_bytes=10 * 1024 * 1024):
+        """
+        初始化图片缓存
+
+        Args:
+            app: Flask应用实例
+            cache_dir: 缓存目录
+            max_bytes: 缓存容量上限（字节）
+            thumbnail_width: 缩略图最大宽度，与文章容器宽度一致
+            max_workers: 下载图片的最大并发数
+            request_timeout: 下载超时时间（秒）
+            max_image_bytes: 单张图片大小上限（字节），超出时放弃下载
+        """
+        self.app = app
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.thumbnail_width = thumbnail_width
+        self.max_workers = max_workers
+        self.request_timeout = request_timeout
+        self.max_image_bytes = max_image_bytes
+        self.index_path = os.path.join(cache_dir, 'index.json')
+        self.base_url = os.environ.get('SERVICE_URL', 'http://localhost:5000').rstrip('/')
+        self.lock = threading.Lock()
+
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+
+        self.index = self._load_index()
+        # 内容哈希到原始URL的映射，图片被淘汰后仍可将/img/<hash>重定向到原始地址
+        self.origins = {digest: url for url, digest in self.index.items()}
+
+    def _load_index(self):
+        """加载原始URL到内容哈希的索引"""
+        if not os.path.exists(self.index_path):
+            return {}
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.error(f"加载图片索引失败: {str(e)}")
+            return {}
+
+    def _save_index(self):
+        """保存索引，调用方需持有锁"""
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.index, f, ensure_ascii=False)
+        os.replace(tmp_path, self.index_path)
+
+    def _original_path(self, digest):
+        """原图缓存路径"""
+        return os.path.join(self.cache_dir, digest)
+
+    def _thumbnail_path(self, digest):
+        """缩略图缓存路径"""
+        return os.path.join(self.cache_dir, f"{digest}.thumb.jpg")
+
+    def add_endpoints(self):
+        """
+        添加图片访问端点到Flask应用
+        """
+        # 只有提供服务时才需要Flask，重建feed等命令行工具只读取索引
+        from flask import abort, redirect, send_file
+
+        @self.app.route('/img/<digest>')
+        def serve_image(digest):
+            if not HASH_PATTERN.match(digest):
+                abort(404)
+
+            # 优先返回缩略图，缩略图不存在时返回原图
+            path = self._thumbnail_path(digest)
+            if not os.path.exists(path):
+                path = self._original_path(digest)
+            if not os.path.exists(path):
+                # 图片已被淘汰，重定向到原始地址，已发布的feed中的链接仍然可用
+                origin = self.origins.get(digest)
+                if origin is None:
+                    abort(404)
+                return redirect(origin, 302)
+
+            # 更新访问时间，供LRU淘汰使用
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+
+            response = send_file(os.path.abspath(path), mimetype=self._guess_mimetype(path), max_age=31536000)
+            response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+            return response
+
+    def _guess_mimetype(self, path):
+        """根据文件头判断图片类型"""
+        with open(path, 'rb') as f:
+            header = f.read(12)
+        if header.startswith(b'\x89PNG'):
+            return 'image/png'
+        if header.startswith(b'GIF8'):
+            return 'image/gif'
+        if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+            return 'image/webp'
+        return 'image/jpeg'
+
+    def local_url(self, image_url):
+        """返回已缓存图片的本地访问地址，未缓存时返回None"""
+        digest = self.index.get(image_url)
+        if digest and os.path.exists(self._original_path(digest)):
+            return f"{self.base_url}/img/{digest}"
+        return None
+
+    def _download(self, image_url):
+        """下载单张图片并写入缓存，返回内容哈希"""
+        if image_url in self.index and os.path.exists(self._original_path(self.index[image_url])):
+            return self.index[image_url]
+
+        import requests  # 延迟导入，缩短服务启动时间
+
+        try:
+            with requests.get(image_url, timeout=self.request_timeout, stream=True) as response:
+                if response.status_code != 200:
+                    logger.warning(f"下载图片失败，状态码: {response.status_code}，URL: {image_url}")
+                    return None
+                # 分块读取，超过大小上限时立即放弃，不把过大的响应读入内存
+                content_length = response.headers.get('Content-Length', '')
+                if content_length.isdigit() and int(content_length) > self.max_image_bytes:
+                    logger.warning(f"图片超过大小上限，跳过: {image_url}，大小: {content_length}")
+                    return None
+                chunks = []
+                size = 0
+                for chunk in response.iter_content(chunk_size=64 * 1024):
+                    size += len(chunk)
+                    if size > self.max_image_bytes:
+                        logger.warning(f"图片超过大小上限，跳过: {image_url}")
+                        return None
+                    chunks.append(chunk)
+                content = b''.join(chunks)
+        except Exception as e:
+            logger.warning(f"下载图片出错: {image_url}，错误: {str(e)}")
+            return None
+
+        digest = hashlib.sha256(content).hexdigest()[:32]
+        original_path = self._original_path(digest)
+        if not os.path.exists(original_path):
+            tmp_path = f"{original_path}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(content)
+            os.replace(tmp_path, original_path)
+            self._create_thumbnail(digest, content)
+
+        with self.lock:
+            self.index[image_url] = digest
+            self.origins[digest] = image_url
+        return digest
+
+    def _create_thumbnail(self, digest, content):
+        """生成压缩后的缩略图，需要Pillow"""
+        try:
+            from PIL import Image
+        except ImportError:  # Pillow为可选依赖，未安装时不生成缩略图
+            return
+        try:
+            with Image.open(io.BytesIO(content)) as img:
+                # 动图保留原图
+                if getattr(img, 'is_animated', False):
+                    return
+                img = img.convert('RGB')
+                if img.width > self.thumbnail_width:
+                    height = int(img.height * self.thumbnail_width / img.width)
+                    img = img.resize((self.thumbnail_width, height), Image.LANCZOS)
+                img.save(self._thumbnail_path(digest), 'JPEG', quality=80, optimize=True, progressive=True)
+
+            # 缩略图没有更小时删除，直接使用原图
+            if os.path.getsize(self._thumbnail_path(digest)) >= len(content):
+                os.remove(self._thumbnail_path(digest))
+        except Exception as e:
+            logger.warning(f"生成缩略图失败: {digest}，错误: {str(e)}")
+
+    def _evict(self):
+        """
+        按最近访问时间淘汰图片，直到缓存大小低于上限，调用方需持有锁
+
+        只删除图片文件，保留索引中的原始URL，用于重定向已发布的链接和再次下载
+        """
+        entries = []
+        total_size = 0
+        for name in os.listdir(self.cache_dir):
+            if not HASH_PATTERN.match(name):
+                continue
+            paths = [self._original_path(name), self._thumbnail_path(name)]
+            size = sum(os.path.getsize(p) for p in paths if os.path.exists(p))
+            last_access = max(os.path.getmtime(p) for p in paths if os.path.exists(p))
+            entries.append((last_access, name, size))
+            total_size += size
+
+        if total_size <= self.max_bytes:
+            return
+
+        entries.sort()
+        evicted = 0
+        for _, name, size in entries:
+            if total_size <= self.max_bytes:
+                break
+            for path in (self._original_path(name), self._thumbnail_path(name)):
+                if os.path.exists(path):
+                    os.remove(path)
+            evicted += 1
+            total_size -= size
+
+        logger.info(f"图片缓存超出上限，淘汰了{evicted}张图片")
+
+    def cache_article_images(self, markdown_contents):
+        """下载文章Markdown内容中的所有图片到缓存，返回成功缓存的数量"""
+        image_urls = []
+        for content in markdown_contents:
+            if content:
+                image_urls.extend(IMAGE_PATTERN.findall(content))
+
+        image_urls = list(dict.fromkeys(url for url in image_urls if url.startswith(('http://', 'https://'))))
+        if not image_urls:
+            return 0
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            digests = list(executor.map(self._download, image_urls))
+
+        with self.lock:
+            self._evict()
+            self._save_index()
+
+        cached = sum(1 for digest in digests if digest)
+        logger.info(f"图片缓存完成: {cached}/{len(image_urls)}张")
+        return cached
+
+
+def image_cache_dir():
+    """返回配置的图片缓存目录，IMAGE_CACHE_ENABLED未开启时返回None"""
+    if os.environ.get('IMAGE_CACHE_ENABLED', '').lower() not in ('1', 'true', 'yes'):
+        return None
+    return os.environ.get('IMAGE_CACHE_DIR', 'image_cache')
+
+
+def setup_image_cache(app):
+    """
+    根据环境变量设置图片缓存，IMAGE_CACHE_ENABLED未开启时返回None
+
+    Args:
+        app: Flask应用实例
+
+    Returns:
+        ImageCache实例或None
+    """
+    cache_dir = image_cache_dir()
+    if cache_dir is None:
+        return None
+
+    max_bytes = int(os.environ.get('IMAGE_CACHE_MAX_MB', 200)) * 1024 * 1024
+    max_image_bytes = int(os.environ.get('IMAGE_CACHE_MAX_IMAGE_MB', 10)) * 1024 * 1024
+    image_cache = ImageCache(app, cache_dir=cache_dir, max_bytes=max_bytes, max_image_bytes=max_image_bytes)
+    image_cache.add_endpoints()
+    if importlib.util.find_spec('PIL') is None:
+        logger.warning("未安装Pillow，图片缓存将不生成缩略图")
+    return image_cache
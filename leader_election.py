@@ -0,0 +1,234 @@
+import os
+import json
+import time
+import fcntl
+import socket
+import shutil
+import tempfile
+import logging
+from persistence import GitRepository
+
+logger = logging.getLogger('leader_election')
+
+LEASE_REF = 'refs/leases/rss-leader'
+
+
+class FileLeaseStore:
+    """基于本地锁文件的租约存储，适用于同一台机器上的多个实例"""
+
+    def __init__(self, lock_path):
+        """初始化文件租约存储"""
+        self.lock_path = lock_path
+
+    def read(self):
+        """读取当前租约，返回(租约字典, 版本标识)"""
+        try:
+            with open(self.lock_path, 'r', encoding='utf-8') as f:
+                content = f.read()
+            return json.loads(content), content
+        except FileNotFoundError:
+            return None, None
+        except Exception as e:
+            logger.warning(f"读取租约文件失败: {str(e)}")
+            return None, None
+
+    def compare_and_swap(self, expected_version, lease):
+        """仅当租约文件仍为expected_version时写入新租约
+
+        读取、比较和写入期间持有旁路锁文件的排他锁，保证多个实例同时接管过期租约时只有一个成功。
+        """
+        new_content = json.dumps(lease, ensure_ascii=False)
+
+        with open(f"{self.lock_path}.lock", 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                _, current_version = self.read()
+                if current_version != expected_version:
+                    return False
+
+                # 写入临时文件后原子替换
+                tmp_path = f"{self.lock_path}.{os.getpid()}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.write(new_content)
+                os.replace(tmp_path, self.lock_path)
+                return True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class GitRefLeaseStore:
+    """基于远程Git引用的租约存储，适用于跨主机的多个实例
+
+    租约内容保存在一个无父提交的提交信息中，推送时使用--force-with-lease
+    实现比较并交换，保证同一时刻只有一个实例能够写入成功。
+    """
+
+    def __init__(self, git_repo=None, ref=LEASE_REF):
+        """初始化Git引用租约存储"""
+        self.git_repo = git_repo or GitRepository()
+        self.ref = ref
+
+    def _init_work_dir(self):
+        """创建仅用于租约操作的临时裸仓库"""
+        work_dir = tempfile.mkdtemp(prefix="git_lease_")
+        if self.git_repo._run_git_command(['git', 'init', '--bare', '-q', work_dir]) is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+            return None
+        return work_dir
+
+    def read(self):
+        """读取当前租约，返回(租约字典, 提交SHA)"""
+        if not self.git_repo.auth_repo_url:
+            return None, None
+
+        work_dir = self._init_work_dir()
+        if not work_dir:
+            return None, None
+
+        try:
+            sha = self._fetch_lease_commit(work_dir)
+            if not sha:
+                return None, None
+
+            message = self.git_repo._run_git_command(
+                ['git', 'log', '-1', '--format=%B', sha],
+                cwd=work_dir
+            )
+            try:
+                return json.loads(message), sha
+            except (TypeError, ValueError):
+                logger.warning("租约引用内容无法解析，视为已过期")
+                return {'holder': None, 'expires_at': 0}, sha
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    def _fetch_lease_commit(self, work_dir):
+        """获取远程租约引用指向的提交，不存在时返回None"""
+        listing = self.git_repo._run_git_command(
+            ['git', 'ls-remote', self.git_repo.auth_repo_url, self.ref],
+            cwd=work_dir
+        )
+        if not listing:
+            return None
+
+        sha = listing.split()[0]
+        if self.git_repo._run_git_command(
+            ['git', 'fetch', '-q', self.git_repo.auth_repo_url, self.ref],
+            cwd=work_dir
+        ) is None:
+            return None
+        return sha
+
+    def compare_and_swap(self, expected_version, lease):
+        """仅当远程租约引用仍指向expected_version时推送新租约"""
+        if not self.git_repo.auth_repo_url:
+            return False
+
+        work_dir = self._init_work_dir()
+        if not work_dir:
+            return False
+
+        try:
+            env_args = [
+                '-c', f'user.name={self.git_repo.username or "rss-leader"}',
+                '-c', f'user.email={self.git_repo.email or "rss-leader@localhost"}'
+            ]
+            empty_tree = self.git_repo._run_git_command(
+                ['git', 'hash-object', '-t', 'tree', '-w', '/dev/null'],
+                cwd=work_dir
+            )
+            if not empty_tree:
+                return False
+
+            new_sha = self.git_repo._run_git_command(
+                ['git', *env_args, 'commit-tree', empty_tree, '-m',
+                 json.dumps(lease, ensure_ascii=False)],
+                cwd=work_dir
+            )
+            if not new_sha:
+                return False
+
+            # 空字符串表示期望远程引用不存在
+            expected = expected_version or ''
+            push_result = self.git_repo._run_git_command(
+                ['git', 'push', '-q', f'--force-with-lease={self.ref}:{expected}',
+                 self.git_repo.auth_repo_url, f'{new_sha}:{self.ref}'],
+                cwd=work_dir
+            )
+            return push_result is not None
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+class LeaderElection:
+    """基于租约的领导者选举，保证只有一个实例负责爬取和推送"""
+
+    def __init__(self, store, lease_ttl=7200, instance_id=None):
+        """
+        初始化领导者选举
+
+        Args:
+            store: 租约存储（FileLeaseStore或GitRefLeaseStore）
+            lease_ttl: 租约有效期（秒），应大于更新间隔
+            instance_id: 当前实例标识，默认使用主机名和进程号
+        """
+        self.store = store
+        self.lease_ttl = lease_ttl
+        self.instance_id = instance_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.is_leader = False
+
+    def try_acquire(self):
+        """尝试获取或续约领导者租约，返回当前实例是否为领导者"""
+        try:
+            lease, version = self.store.read()
+            now = time.time()
+
+            if lease and lease.get('holder') != self.instance_id and lease.get('expires_at', 0) > now:
+                if self.is_leader:
+                    logger.warning(f"领导者租约已被其他实例持有: {lease.get('holder')}")
+                self.is_leader = False
+                return False
+
+            new_lease = {
+                'holder': self.instance_id,
+                'expires_at': now + self.lease_ttl,
+                'renewed_at': now
+            }
+            acquired = self.store.compare_and_swap(version, new_lease)
+
+            if acquired and not self.is_leader:
+                logger.info(f"当前实例成为领导者: {self.instance_id}")
+            elif not acquired:
+                logger.info("获取领导者租约失败，当前实例作为跟随者运行")
+
+            self.is_leader = acquired
+            return acquired
+
+        except Exception as e:
+            logger.error(f"领导者选举出错: {str(e)}")
+            self.is_leader = False
+            return False
+
+
+def create_leader_election(lease_ttl=7200):
+    """根据环境变量创建领导者选举实例
+
+    LEADER_LEASE_STORE为git时使用远程Git引用，为file时使用本地锁文件；
+    未设置时，若Git环境变量完整则使用git，否则使用file。
+    """
+    store_type = os.environ.get('LEADER_LEASE_STORE')
+    instance_id = os.environ.get('INSTANCE_ID')
+
+    git_repo = GitRepository()
+
+    if store_type is None:
+        store_type = 'git' if git_repo.auth_repo_url else 'file'
+
+    if store_type == 'git':
+        store = GitRefLeaseStore(git_repo)
+    else:
+        lock_path = os.environ.get('LEADER_LOCK_PATH', os.path.join(tempfile.gettempdir(), 'latepost_rss_leader.lock'))
+        store = FileLeaseStore(lock_path)
+
+    logger.info(f"领导者选举使用{store_type}租约存储")
+    return LeaderElection(store, lease_ttl=lease_ttl, instance_id=instance_id)
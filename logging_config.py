@@ -0,0 +1,188 @@
+import os
+import sys
+import copy
+import json
+import time
+import queue
+import atexit
+import random
+import logging
+import logging.handlers
+from datetime import datetime, timezone
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# 结构化日志的字段，通过extra=log_fields(...)附加到日志记录上
+STRUCTURED_FIELDS = ('source', 'article_id', 'stage', 'duration_ms', 'count')
+
+_listener = None
+_queue_handler = None
+
+
+def log_fields(article_id=None, stage=None, duration=None, source=None, count=None, sampled=False):
+    """
+    构造结构化日志字段，用作logger的extra参数
+
+    Args:
+        article_id: 文章ID
+        stage: 所处阶段，如scrape、save、ping
+        duration: 耗时（秒）
+        source: 文章来源名称
+        count: 数量，如本批爬取的文章数
+        sampled: 是否为高频的逐条事件，按LOG_SAMPLE_RATE抽样输出
+    """
+    fields = {'sampled': sampled}
+    if article_id is not None:
+        fields['article_id'] = article_id
+    if stage is not None:
+        fields['stage'] = stage
+    if duration is not None:
+        fields['duration_ms'] = round(duration * 1000, 1)
+    if source is not None:
+        fields['source'] = source
+    if count is not None:
+        fields['count'] = count
+    return fields
+
+
+class JsonFormatter(logging.Formatter):
+    """将日志记录格式化为单行JSON，便于按文章ID、阶段和耗时查询分析吞吐量"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        for field in STRUCTURED_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        # 抽样事件记录抽样率，统计时按1/sample_rate还原总量
+        if getattr(record, 'sample_rate', None) is not None:
+            entry['sample_rate'] = record.sample_rate
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = self.formatStack(record.stack_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """对标记为sampled的INFO及以下级别事件抽样，批量爬取时日志量保持稳定；警告和错误始终保留"""
+
+    def __init__(self, sample_rate):
+        super().__init__()
+        self.sample_rate = sample_rate
+
+    def filter(self, record):
+        if not getattr(record, 'sampled', False) or record.levelno > logging.INFO:
+            return True
+        if random.random() >= self.sample_rate:
+            return False
+        record.sample_rate = self.sample_rate
+        return True
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """写入有界队列的日志处理器，队列已满时丢弃记录而不是阻塞调用线程，并定期报告丢弃数量"""
+
+    def __init__(self, log_queue, report_interval=60):
+        super().__init__(log_queue)
+        self.report_interval = report_interval
+        self.dropped = 0
+        self.reported = 0
+        self.last_report = time.monotonic()
+
+    def prepare(self, record):
+        """合并消息参数，但保留异常信息，由输出端的格式化器（如JSON的exception字段）处理"""
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        return record
+
+    def _dropped_record(self):
+        """生成报告丢弃数量的日志记录"""
+        count = self.dropped - self.reported
+        self.reported = self.dropped
+        self.last_report = time.monotonic()
+        return logging.LogRecord('logging_config', logging.WARNING, __file__, 0,
+                                 f"日志队列已满，丢弃了{count}条日志（累计{self.dropped}条）", None, None)
+
+    def enqueue(self, record):
+        # Handler.handle已持有处理器锁，计数不需要额外加锁
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return
+
+        if self.dropped > self.reported and time.monotonic() - self.last_report >= self.report_interval:
+            try:
+                self.queue.put_nowait(self._dropped_record())
+            except queue.Full:
+                pass
+
+    def report_dropped(self):
+        """程序退出前报告尚未报告的丢弃数量，此时可以短暂阻塞"""
+        self.acquire()
+        try:
+            if self.dropped > self.reported:
+                try:
+                    self.queue.put(self._dropped_record(), timeout=1)
+                except queue.Full:
+                    pass
+        finally:
+            self.release()
+
+
+def _stop_listener():
+    """程序退出时报告丢弃数量并写出队列中剩余的日志"""
+    global _listener
+    if _listener is not None:
+        _queue_handler.report_dropped()
+        _listener.stop()
+        _listener = None
+
+
+def configure_logging(level=logging.INFO):
+    """
+    配置根日志记录器，只应在程序入口调用一次，各模块只需获取自己的logger
+
+    日志先写入内存队列，由后台线程格式化并输出，爬取和请求处理线程不会被慢速的磁盘或stdout阻塞。
+    LOG_JSON=1时输出JSON格式，LOG_SAMPLE_RATE控制逐条事件的抽样率（默认1，即全部输出）。
+    """
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+
+    output_handler = logging.StreamHandler(sys.stderr)
+    if os.environ.get('LOG_JSON', '0').lower() in ('1', 'true', 'yes'):
+        output_handler.setFormatter(JsonFormatter())
+    else:
+        output_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    try:
+        sample_rate = min(1.0, max(0.0, float(os.environ.get('LOG_SAMPLE_RATE', '1'))))
+    except ValueError:
+        sample_rate = 1.0
+
+    log_queue = queue.Queue(maxsize=int(os.environ.get('LOG_QUEUE_SIZE', '10000')))
+    _queue_handler = NonBlockingQueueHandler(log_queue)
+    _queue_handler.addFilter(SamplingFilter(sample_rate))
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_queue_handler)
+
+    _listener = logging.handlers.QueueListener(log_queue, output_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_stop_listener)
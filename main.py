@@ -3,85 +3,248 @@ import time
 import logging
 import threading
 from datetime import datetime
-from flask import Flask, send_from_directory
+from logging_config import configure_logging, log_fields
+from flask import Flask, Response, request, send_from_directory
 from simple_scraper import SimpleLatePostScraper
 from update_rss import RSSUpdater
-from feed_initializer import initialize_feed
-from persistence import GitRepository
+from feed_initializer import initialize_feeds
+from persistence import GitRepository, HASHES_NAME, get_article_restorer
 from health_check import setup_health_check
+from leader_election import create_leader_election
+from websub import setup_websub
+from image_cache import setup_image_cache
+from article_archive import article_storage_files, load_article_markdown
+from delta_feed import FeedHistory, accepts_feed_delta
+from update_watchdog import UpdateWatchdog, StaleGenerationError
+from sources import LATEPOST_SOURCE, load_sources, SOURCES
+from poll_shaping import setup_poll_shaping
 
 # 配置日志
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+configure_logging()
 logger = logging.getLogger('main')
 
 # 创建Flask应用
 app = Flask(__name__)
 
-# 设置健康检查
-health_checker = setup_health_check(app)
+# 文章来源：默认的晚点LatePost和SOURCES_CONFIG中配置的其他来源，各自生成独立的feed
+sources = load_sources()
 
 # 全局变量
-RSS_UPDATE_INTERVAL = 3600  # 1小时更新一次
-ARTICLES_DIR = 'latepost_articles'
-FEED_PATH = 'feed.xml'
+RSS_UPDATE_INTERVAL = max(source.interval for source in sources)  # 各来源中最长的更新间隔
+RECHECK_EVERY_CYCLES = 6  # 每个来源每6个更新周期重新检查一次最近文章的内容变化
+RECHECK_ARTICLE_COUNT = 5  # 每次重新检查的最近文章数量
+ARTICLES_DIR = LATEPOST_SOURCE.articles_dir
+FEED_PATH = LATEPOST_SOURCE.feed_path
+
+# RSS更新线程的看门狗，阶段超时时重启更新线程
+update_watchdog = UpdateWatchdog(sleep_interval=RSS_UPDATE_INTERVAL)
+
+# 设置健康检查
+health_checker = setup_health_check(app, watchdog=update_watchdog)
+
+# 设置WebSub Hub，向订阅者主动推送更新
+websub_hub = setup_websub(app, feed_path=FEED_PATH)
+
+# feed版本历史，用于RFC 3229+feed增量响应
+feed_history = FeedHistory(feed_path=FEED_PATH)
+
+# feed轮询整形：缓存时间与下一次计划更新对齐，限制过于频繁的客户端
+poll_shaper = setup_poll_shaping(app, default_interval=LATEPOST_SOURCE.interval)
+
+# 设置图片缓存（可选，通过IMAGE_CACHE_ENABLED开启）
+image_cache = setup_image_cache(app)
+
+# 领导者选举：只有领导者实例爬取和推送，跟随者只拉取和提供服务
+leader_election = create_leader_election(lease_ttl=RSS_UPDATE_INTERVAL * 2)
+
+def _changed_article_files(source, article_ids):
+    """返回需要随feed一起同步到Git仓库的文章文件"""
+    paths = article_storage_files(source.articles_dir, article_ids)
+    hashes_path = os.path.join(source.articles_dir, HASHES_NAME)
+    # 尚未与远程合并的哈希文件可能缺少历史记录，不推送以免覆盖远程版本
+    if os.path.exists(hashes_path) and get_article_restorer(source.articles_dir).restored:
+        paths.append(hashes_path)
+    return paths
 
-def check_and_update_rss():
-    """检查并更新RSS"""
+def _publish(source, generation):
+    """通过WebSub推送给订阅者，目前只有默认来源的feed.xml支持订阅"""
+    if source is LATEPOST_SOURCE:
+        update_watchdog.enter(generation, 'publish')
+        websub_hub.publish()
+
+def check_and_update_rss(source=LATEPOST_SOURCE, recheck_recent=False, generation=None):
+    """检查并更新某个来源的RSS
+
+    Args:
+        source: 文章来源
+        recheck_recent: 是否重新检查最近文章的内容变化
+        generation: 调用线程的代号，线程被看门狗替换后在写入和推送前放弃本次更新
+    """
+    if generation is None:
+        generation = update_watchdog.generation
     try:
+        is_primary = source is LATEPOST_SOURCE
+        
         # 初始化RSS更新器和爬虫
-        rss_updater = RSSUpdater(feed_path=FEED_PATH, articles_dir=ARTICLES_DIR)
-        scraper = SimpleLatePostScraper(output_dir=ARTICLES_DIR)
+        rss_updater = RSSUpdater(
+            feed_path=source.feed_path,
+            articles_dir=source.articles_dir,
+            hub_url=websub_hub.hub_url if is_primary else None,
+            self_url=websub_hub.topic_url if is_primary else None,
+            image_cache=image_cache,
+            auto_sync=False,  # 由本函数将feed和新文章合并为一次提交推送
+            article_url_template=source.url_template,
+            ttl=source.interval // 60  # 建议客户端按更新间隔轮询
+        )
+        scraper = SimpleLatePostScraper(output_dir=source.articles_dir, source=source)
         git_repo = GitRepository()
         
-        # 获取最新文章ID
+        # 新接入的来源还没有feed时，创建空feed并从初始高水位开始
+        if not is_primary:
+            rss_updater.ensure_feed(source.title, source.link, source.description)
+        
+        # 获取最新文章ID（高水位）
         latest_id = rss_updater.get_latest_article_id()
-        if not latest_id:
-            logger.error("无法获取最新文章ID，跳过本次更新")
+        if latest_id is None and not is_primary:
+            latest_id = source.start_id
+        if latest_id is None:
+            logger.error(f"无法获取来源{source.name}的最新文章ID，跳过本次更新")
             return
         
         latest_id = int(latest_id)
-        logger.info(f"当前最新文章ID: {latest_id}")
-        
-        # 尝试爬取新文章（最新ID后的10篇）
-        start_id = latest_id + 1
-        end_id = latest_id + 10
+        logger.info(f"来源{source.name}当前最新文章ID: {latest_id}")
         
-        logger.info(f"开始爬取新文章，ID范围: {start_id} - {end_id}")
-        results = scraper.scrape_articles_range(start_id, end_id)
+        # 通过来源的发现策略爬取新文章
+        logger.info(f"开始爬取来源{source.name}的新文章")
+        update_watchdog.beat('scrape')
+        results = scraper.discover_and_scrape(latest_id)
+        # 没有新文章时所有候选ID都返回404，只要目标网站正常响应就算成功；全部请求出错时不记录
+        if results['success'] or results['responded']:
+            update_watchdog.record_success('scrape')
+        else:
+            logger.warning(f"来源{source.name}的所有请求均失败，不记录爬取成功")
         
         # 如果有新文章，更新RSS
         if results['success']:
             logger.info(f"成功爬取{len(results['success'])}篇新文章")
             
+            # 缓存新文章中的图片
+            if image_cache:
+                update_watchdog.enter(generation, 'images')
+                image_cache.cache_article_images([
+                    load_article_markdown(source.articles_dir, article_id, rss_updater.archive)
+                    for article_id in results['success']
+                ])
+            
             # 更新RSS
-            if rss_updater.update_feed(results['success']):
+            update_watchdog.enter(generation, 'update')
+            if not rss_updater.update_feed(results['success']):
+                logger.error("RSS更新失败")
+            elif not rss_updater.feed_changed:
+                logger.info("RSS内容没有变化，跳过推送")
+            else:
                 logger.info("RSS更新成功")
                 
-                # 推送到Git仓库
-                if git_repo.push_feed_to_repository(FEED_PATH):
+                # 推送feed和新文章到Git仓库
+                update_watchdog.enter(generation, 'push')
+                if git_repo.push_feed_to_repository(source.feed_path, _changed_article_files(source, results['success'])):
                     logger.info("成功推送RSS到Git仓库")
+                    update_watchdog.record_success('push')
                 else:
                     logger.error("推送RSS到Git仓库失败")
-            else:
-                logger.error("RSS更新失败")
+                
+                _publish(source, generation)
         else:
             logger.info("没有发现新文章")
+        
+        # 定期重新检查最近文章是否被编辑
+        if recheck_recent:
+            update_watchdog.enter(generation, 'recheck')
+            if rss_updater.refresh_recent_articles(scraper, RECHECK_ARTICLE_COUNT):
+                logger.info("最近文章内容有更新，已重新生成RSS")
+                update_watchdog.enter(generation, 'push')
+                if git_repo.push_feed_to_repository(source.feed_path, _changed_article_files(source, rss_updater.edited_article_ids)):
+                    update_watchdog.record_success('push')
+                _publish(source, generation)
     
+    except StaleGenerationError as e:
+        logger.warning(str(e))
     except Exception as e:
-        logger.error(f"RSS更新过程出错: {str(e)}")
+        logger.error(f"来源{source.name}的RSS更新过程出错: {str(e)}")
 
-def rss_update_worker():
-    """RSS更新工作线程"""
-    while True:
+def rss_update_worker(generation, initialize=False):
+    """RSS更新工作线程，被看门狗替换后退出"""
+    update_watchdog.attach(generation)
+    
+    # 在后台初始化各来源的feed（需要克隆Git仓库），不阻塞Web服务绑定端口
+    if initialize:
+        logger.info("开始初始化feed文件")
+        update_watchdog.beat('pull')
+        if FEED_PATH in initialize_feeds([source.feed_path for source in sources]):
+            logger.info("feed.xml初始化成功")
+            update_watchdog.record_success('pull')
+        else:
+            logger.error("feed.xml初始化失败")
+    
+    # 每个来源独立的下一次更新时间和更新周期计数
+    next_run = {source.name: 0 for source in sources}
+    cycles = {source.name: 0 for source in sources}
+    while update_watchdog.is_current(generation):
         try:
-            logger.info("开始RSS更新检查")
-            check_and_update_rss()
-            logger.info(f"RSS更新检查完成，等待{RSS_UPDATE_INTERVAL}秒后再次检查")
+            update_watchdog.beat('leader')
+            if leader_election.try_acquire():
+                for source in sources:
+                    if not update_watchdog.is_current(generation):
+                        break
+                    if time.time() < next_run[source.name]:
+                        continue
+                    logger.info(f"开始来源{source.name}的RSS更新检查")
+                    cycle_start = time.perf_counter()
+                    check_and_update_rss(source, recheck_recent=cycles[source.name] % RECHECK_EVERY_CYCLES == 0,
+                                         generation=generation)
+                    logger.info(f"来源{source.name}的RSS更新检查完成",
+                                extra=log_fields(stage='cycle', duration=time.perf_counter() - cycle_start,
+                                                 source=source.name))
+                    cycles[source.name] += 1
+                    next_run[source.name] = time.time() + source.interval
+                    poll_shaper.set_next_update(source.name, next_run[source.name])
+            else:
+                logger.info("当前实例为跟随者，从Git仓库拉取各来源的最新feed")
+                update_watchdog.beat('pull')
+                previous_digest = websub_hub.feed_digest()
+                # 一次克隆拉取所有来源的feed，/feeds/<name>.xml在跟随者上同样可用
+                if FEED_PATH in initialize_feeds([source.feed_path for source in sources]):
+                    update_watchdog.record_success('pull')
+                    # 订阅保存在各实例本地，跟随者拉取到新的feed.xml后推送给自己的订阅者
+                    if previous_digest is not None and websub_hub.feed_digest() != previous_digest:
+                        update_watchdog.enter(generation, 'publish')
+                        websub_hub.publish()
+                for source in sources:
+                    next_run[source.name] = time.time() + source.interval
+                    poll_shaper.set_next_update(source.name, next_run[source.name])
+        except StaleGenerationError as e:
+            logger.warning(str(e))
         except Exception as e:
             logger.error(f"RSS更新工作线程出错: {str(e)}")
         
-        # 等待下一次更新
-        time.sleep(RSS_UPDATE_INTERVAL)
+        if not update_watchdog.is_current(generation):
+            break
+        
+        # 等待最早到期的来源
+        sleep_seconds = max(0, min(next_run.values()) - time.time())
+        logger.info(f"RSS更新检查完成，等待{int(sleep_seconds)}秒后再次检查")
+        update_watchdog.beat('sleep')
+        time.sleep(sleep_seconds)
+    
+    logger.warning(f"RSS更新线程（第{generation}代）已被替换，退出")
+
+def start_rss_update_thread(initialize=False):
+    """启动新一代RSS更新线程"""
+    generation = update_watchdog.new_generation()
+    rss_thread = threading.Thread(target=rss_update_worker, args=(generation, initialize), name=f'rss-update-{generation}')
+    rss_thread.daemon = True
+    rss_thread.start()
+    return rss_thread
 
 @app.route('/')
 def index():
@@ -90,24 +253,59 @@ def index():
 
 @app.route('/feed.xml')
 def serve_rss():
-    """提供RSS feed文件"""
-    return send_from_directory('.', 'feed.xml')
+    """提供RSS feed文件，支持ETag条件请求和RFC 3229+feed增量响应"""
+    if not os.path.exists(FEED_PATH):
+        # 首次启动时feed.xml可能仍在后台初始化
+        return 'feed.xml尚未就绪', 503, {'Retry-After': '30'}
+    
+    # ETag和响应内容来自同一次读取，避免feed.xml在两次读取之间被替换
+    etag, content = feed_history.current()
+    client_etags = request.if_none_match.as_set()
+    
+    # 客户端声明A-IM: feed且持有历史版本时，只返回新增条目
+    if etag not in client_etags and accepts_feed_delta(request.headers.get('A-IM')):
+        base_etag, delta_content = feed_history.delta(client_etags, (etag, content))
+        if delta_content is not None:
+            response = Response(delta_content, status=226, mimetype='application/xml')
+            response.set_etag(etag)
+            response.headers['IM'] = 'feed'
+            response.headers['Delta-Base'] = f'"{base_etag}"'
+            response.headers['Cache-Control'] = 'no-store, im'
+            response.headers['Link'] = websub_hub.link_header()
+            return response
+    
+    response = Response(content, mimetype='application/xml')
+    response.set_etag(etag)
+    response.make_conditional(request)
+    response.headers['Link'] = websub_hub.link_header()
+    return poll_shaper.apply_cache_headers(response, LATEPOST_SOURCE.name)
+
+@app.route('/feeds/<name>.xml')
+def serve_source_feed(name):
+    """提供其他来源的RSS feed文件，支持ETag条件请求"""
+    source = SOURCES.get(name)
+    if source is None:
+        return f'未知的来源: {name}', 404
+    if source is LATEPOST_SOURCE:
+        return serve_rss()
+    if not os.path.exists(source.feed_path):
+        return f'{name}的feed尚未就绪', 503, {'Retry-After': '30'}
+    
+    response = send_from_directory(os.path.dirname(os.path.abspath(source.feed_path)),
+                                   os.path.basename(source.feed_path))
+    response.make_conditional(request)
+    return poll_shaper.apply_cache_headers(response, source.name)
 
 def main():
     """主函数"""
     try:
-        # 初始化feed.xml
-        logger.info("开始初始化feed.xml")
-        if initialize_feed():
-            logger.info("feed.xml初始化成功")
+        # 启动RSS更新线程（首先在后台初始化feed.xml）和看门狗
+        if os.environ.get('RSS_UPDATE_ENABLED', '1').lower() not in ('0', 'false', 'no'):
+            logger.info("启动RSS更新线程")
+            start_rss_update_thread(initialize=True)
+            update_watchdog.start(start_rss_update_thread)
         else:
-            logger.error("feed.xml初始化失败")
-        
-        # 启动RSS更新线程
-        logger.info("启动RSS更新线程")
-        rss_thread = threading.Thread(target=rss_update_worker)
-        rss_thread.daemon = True
-        rss_thread.start()
+            logger.info("RSS_UPDATE_ENABLED已关闭，只提供Web服务")
         
         # 启动Flask应用
         port = int(os.environ.get('PORT', 5000))
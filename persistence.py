@@ -1,20 +1,46 @@
 import os
+import json
 import subprocess
 import tempfile
 import shutil
+import threading
+import time
 from datetime import datetime
 import xml.etree.ElementTree as ET
 import logging
 
-# 配置日志
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger('persistence')
 
+HASHES_NAME = 'content_hashes.json'  # 文章目录中的内容哈希文件
+
+def write_file_atomically(path, content):
+    """写入临时文件后原子替换目标文件，读取方不会读到写了一半的内容
+
+    Args:
+        path: 目标文件路径
+        content: 文件内容（bytes），或接收文件对象并写入内容的函数
+    """
+    target_dir = os.path.dirname(os.path.abspath(path))
+    os.makedirs(target_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix='.tmp_', dir=target_dir)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            if callable(content):
+                content(f)
+            else:
+                f.write(content)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
 class GitRepository:
     """Git仓库操作类，用于克隆、拉取和推送RSS文件"""
     
-    def __init__(self):
+    def __init__(self, command_timeout=120):
         """初始化Git仓库操作类"""
+        self.command_timeout = command_timeout  # 单条Git命令的超时时间（秒）
         self.repo_url = os.environ.get('GIT_REPO_URL')
         self.username = os.environ.get('GIT_USERNAME')
         self.email = os.environ.get('GIT_EMAIL')
@@ -44,15 +70,19 @@ class GitRepository:
                 cwd=cwd,
                 check=True,
                 capture_output=True,
-                text=True
+                text=True,
+                timeout=self.command_timeout
             )
             return result.stdout.strip()
         except subprocess.CalledProcessError as e:
             logger.error(f"Git命令执行失败: {e.stderr}")
             return None
+        except subprocess.TimeoutExpired:
+            logger.error(f"Git命令执行超时（{self.command_timeout}秒）: {command[1] if len(command) > 1 else command[0]}")
+            return None
     
-    def clone_repository(self):
-        """克隆仓库到临时目录"""
+    def clone_repository(self, depth=None):
+        """克隆仓库到临时目录，depth指定时进行浅克隆"""
         if not self.auth_repo_url:
             logger.error("未配置有效的Git仓库URL")
             return None
@@ -62,8 +92,11 @@ class GitRepository:
         logger.info(f"克隆仓库到临时目录: {temp_dir}")
         
         # 克隆仓库
+        command = ['git', 'clone']
+        if depth:
+            command += ['--depth', str(depth)]
         result = self._run_git_command(
-            ['git', 'clone', self.auth_repo_url, temp_dir]
+            command + [self.auth_repo_url, temp_dir]
         )
         
         if result is None:
@@ -77,27 +110,46 @@ class GitRepository:
         
         return temp_dir
     
-    def push_feed_to_repository(self, feed_path):
-        """将更新后的feed.xml推送到Git仓库"""
+    def push_feed_to_repository(self, feed_path, extra_files=None):
+        """将更新后的feed.xml推送到Git仓库
+        
+        Args:
+            feed_path: feed.xml路径
+            extra_files: 需要一并提交的其他文件（相对路径，如新保存的文章），与feed.xml合并为一次提交
+        """
         if not os.path.exists(feed_path):
             logger.error(f"feed文件不存在: {feed_path}")
             return False
         
-        # 克隆仓库
-        repo_dir = self.clone_repository()
+        # 浅克隆仓库，历史中的归档版本不需要下载
+        repo_dir = self.clone_repository(depth=1)
         if not repo_dir:
             return False
         
         try:
-            # 复制feed.xml到仓库
-            repo_feed_path = os.path.join(repo_dir, 'feed.xml')
+            # 复制feed到仓库中的相同相对路径（默认来源为feed.xml，其他来源为feeds/<名称>.xml）
+            feed_relpath = os.path.relpath(feed_path)
+            repo_feed_path = os.path.join(repo_dir, feed_relpath)
+            os.makedirs(os.path.dirname(repo_feed_path), exist_ok=True)
             shutil.copy2(feed_path, repo_feed_path)
             
+            # 复制其他文件到仓库中的相同相对路径
+            extra_files = [path for path in (extra_files or []) if os.path.exists(path)]
+            for path in extra_files:
+                repo_path = os.path.join(repo_dir, os.path.relpath(path))
+                os.makedirs(os.path.dirname(repo_path), exist_ok=True)
+                shutil.copy2(path, repo_path)
+            
             # 添加文件到Git
-            self._run_git_command(['git', 'add', 'feed.xml'], cwd=repo_dir)
+            self._run_git_command(
+                ['git', 'add', feed_relpath] + [os.path.relpath(path) for path in extra_files],
+                cwd=repo_dir
+            )
             
             # 提交更改
             commit_message = f"更新RSS feed - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+            if extra_files:
+                commit_message += f"，同步{len(extra_files)}个文章文件"
             self._run_git_command(
                 ['git', 'commit', '-m', commit_message],
                 cwd=repo_dir
@@ -128,30 +180,125 @@ class GitRepository:
             # 清理临时目录
             shutil.rmtree(repo_dir, ignore_errors=True)
     
-    def get_remote_feed(self):
-        """从远程仓库获取feed.xml文件"""
+    def get_remote_feed(self, feed_path='feed.xml'):
+        """从远程仓库获取feed文件的内容，不存在时返回None"""
+        return self.get_remote_feeds([feed_path]).get(feed_path)
+    
+    def get_remote_feeds(self, feed_paths):
+        """通过一次浅克隆从远程仓库获取多个feed文件，返回feed路径到内容的字典，缺少的文件不包含在内"""
         # 克隆仓库
-        repo_dir = self.clone_repository()
+        repo_dir = self.clone_repository(depth=1)
         if not repo_dir:
-            return None
+            return {}
         
         try:
-            # 检查feed.xml是否存在
-            repo_feed_path = os.path.join(repo_dir, 'feed.xml')
-            if not os.path.exists(repo_feed_path):
-                logger.warning("远程仓库中不存在feed.xml文件")
-                return None
-            
-            # 返回feed.xml的内容
-            with open(repo_feed_path, 'r', encoding='utf-8') as f:
-                content = f.read()
+            feeds = {}
+            for feed_path in feed_paths:
+                # 与推送时相同，按相对路径在仓库中查找
+                repo_feed_path = os.path.join(repo_dir, os.path.relpath(feed_path))
+                if not os.path.exists(repo_feed_path):
+                    logger.warning(f"远程仓库中不存在feed文件: {feed_path}")
+                    continue
+                with open(repo_feed_path, 'r', encoding='utf-8') as f:
+                    feeds[feed_path] = f.read()
             
-            return content
+            return feeds
         
         finally:
             # 清理临时目录
             shutil.rmtree(repo_dir, ignore_errors=True)
 
+class ArticleRestorer:
+    """从Git仓库按需恢复文章目录，首次访问缺失文章时才克隆仓库，不阻塞启动"""
+    
+    def __init__(self, articles_dir='latepost_articles', retry_interval=600):
+        """初始化文章恢复器"""
+        self.articles_dir = articles_dir
+        self.retry_interval = retry_interval  # 恢复失败后再次尝试的间隔（秒）
+        self.lock = threading.Lock()
+        self.restored = False
+        self.last_attempt = 0
+    
+    def _merge_hashes(self, local_path, remote_path):
+        """将远程的内容哈希合并到本地文件，同一文章以本地记录为准，返回是否有变化"""
+        try:
+            with open(local_path, 'r', encoding='utf-8') as f:
+                local_hashes = json.load(f)
+            with open(remote_path, 'r', encoding='utf-8') as f:
+                remote_hashes = json.load(f)
+        except Exception as e:
+            logger.warning(f"合并内容哈希失败: {str(e)}")
+            return 0
+        
+        merged = dict(remote_hashes.get('articles', {}))
+        merged.update(local_hashes.get('articles', {}))
+        if merged == local_hashes.get('articles', {}):
+            return 0
+        local_hashes['articles'] = merged
+        write_file_atomically(local_path, json.dumps(local_hashes, ensure_ascii=False, indent=2).encode('utf-8'))
+        logger.info(f"合并了远程内容哈希，共{len(merged)}篇文章")
+        return 1
+    
+    def ensure_restored(self):
+        """将远程仓库中本地缺失的文章文件复制到本地，返回是否恢复了新文件"""
+        with self.lock:
+            if self.restored or time.time() - self.last_attempt < self.retry_interval:
+                return False
+            self.last_attempt = time.time()
+            
+            git_repo = GitRepository()
+            if not git_repo.auth_repo_url:
+                self.restored = True
+                return False
+            
+            repo_dir = git_repo.clone_repository(depth=1)
+            if not repo_dir:
+                logger.error("克隆仓库失败，暂时无法恢复文章")
+                return False
+            
+            try:
+                remote_dir = os.path.join(repo_dir, os.path.relpath(self.articles_dir))
+                restored_count = 0
+                if os.path.isdir(remote_dir):
+                    os.makedirs(self.articles_dir, exist_ok=True)
+                    for filename in os.listdir(remote_dir):
+                        local_path = os.path.join(self.articles_dir, filename)
+                        remote_path = os.path.join(remote_dir, filename)
+                        # 打包归档和索引作为整体在下面合并
+                        if filename.endswith(('.pack', '.idx')):
+                            continue
+                        if os.path.exists(local_path):
+                            # 内容哈希与远程合并，保留远程的历史记录；其他文件保留本地版本
+                            if filename == HASHES_NAME:
+                                restored_count += self._merge_hashes(local_path, remote_path)
+                            continue
+                        shutil.copy2(remote_path, local_path)
+                        restored_count += 1
+                    
+                    # 延迟导入，article_archive依赖本模块
+                    from article_archive import merge_remote_archive
+                    restored_count += merge_remote_archive(self.articles_dir, remote_dir)
+                
+                self.restored = True
+                logger.info(f"从Git仓库恢复了{restored_count}个文章文件")
+                return restored_count > 0
+            
+            finally:
+                shutil.rmtree(repo_dir, ignore_errors=True)
+
+
+_restorers = {}
+_restorers_lock = threading.Lock()
+
+
+def get_article_restorer(articles_dir='latepost_articles'):
+    """返回文章目录对应的恢复器，同一目录在进程内只恢复一次"""
+    key = os.path.abspath(articles_dir)
+    with _restorers_lock:
+        if key not in _restorers:
+            _restorers[key] = ArticleRestorer(articles_dir)
+        return _restorers[key]
+
 def compare_feed_dates(local_feed_path, remote_feed_content):
     """比较本地和远程feed.xml的lastBuildDate，返回较新的那个"""
     try:
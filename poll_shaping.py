@@ -0,0 +1,140 @@
+import os
+import time
+import math
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from flask import request
+
+logger = logging.getLogger('poll_shaping')
+
+
+class PollShaper:
+    """
+    feed轮询整形：根据下一次计划更新时间设置Cache-Control和Expires，
+    并用有界的内存表记录每个客户端的轮询频率，对过于频繁的客户端返回429
+    """
+    def __init__(self, app, default_interval=3600, max_clients=10000, burst=10, polls_per_hour=60,
+                 min_max_age=60):
+        """
+        初始化轮询整形
+
+        Args:
+            app: Flask应用实例
+            default_interval: 还没有计划更新时间时使用的缓存时间（秒）
+            max_clients: 内存中最多记录的客户端数量，超出时淘汰最久未访问的客户端
+            burst: 每个客户端允许的突发请求数
+            polls_per_hour: 每个客户端每小时允许的平均请求数
+            min_max_age: 缓存时间下限（秒），更新即将开始或正在进行时使用
+        """
+        self.app = app
+        self.default_interval = default_interval
+        self.max_clients = max_clients
+        self.burst = burst
+        self.refill_rate = max(polls_per_hour, 1) / 3600.0  # 每秒恢复的请求额度
+        self.min_max_age = min_max_age
+
+        self.lock = threading.Lock()
+        self.next_updates = {}  # feed名称 -> 下一次计划更新的时间戳
+        self.clients = OrderedDict()  # 客户端 -> (剩余额度, 上次请求时间)，按最近访问排序
+
+    def set_next_update(self, feed_name, timestamp):
+        """由更新线程调用，记录某个feed下一次计划更新的时间"""
+        with self.lock:
+            self.next_updates[feed_name] = timestamp
+
+    def max_age(self, feed_name):
+        """返回距离下一次计划更新的秒数，作为客户端的缓存时间"""
+        with self.lock:
+            next_update = self.next_updates.get(feed_name)
+        if next_update is None:
+            return self.default_interval
+        return max(self.min_max_age, int(next_update - time.time()))
+
+    def apply_cache_headers(self, response, feed_name):
+        """设置与下一次计划更新对齐的Cache-Control和Expires"""
+        max_age = self.max_age(feed_name)
+        # send_from_directory默认设置no-cache，会让客户端每次都重新验证，需要清除
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+        response.expires = datetime.now(timezone.utc) + timedelta(seconds=max_age)
+        return response
+
+    def _client_key(self):
+        """返回客户端标识：使用可信代理追加的地址（由ProxyFix写入remote_addr），
+        不使用客户端可以任意伪造的X-Forwarded-For最左侧地址"""
+        return request.remote_addr
+
+    def check_client(self, client):
+        """
+        按令牌桶记录一次客户端请求
+
+        Returns:
+            允许请求时返回0，否则返回需要等待的秒数
+        """
+        now = time.monotonic()
+        with self.lock:
+            tokens, last_seen = self.clients.pop(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last_seen) * self.refill_rate)
+
+            if tokens >= 1:
+                self.clients[client] = (tokens - 1, now)
+                retry_after = 0
+            else:
+                self.clients[client] = (tokens, now)
+                retry_after = math.ceil((1 - tokens) / self.refill_rate)
+
+            # 淘汰最久未访问的客户端，保持内存占用有界
+            while len(self.clients) > self.max_clients:
+                self.clients.popitem(last=False)
+        return retry_after
+
+    def add_rate_limit(self):
+        """
+        对feed请求进行限流
+        """
+        @self.app.before_request
+        def limit_feed_polls():
+            if request.path != '/feed.xml' and not request.path.startswith('/feeds/'):
+                return None
+
+            client = self._client_key()
+            retry_after = self.check_client(client)
+            if not retry_after:
+                return None
+
+            logger.info(f"客户端轮询过于频繁，返回429: {client}")
+            return '请求过于频繁，请稍后再试', 429, {'Retry-After': str(retry_after)}
+
+
+def setup_poll_shaping(app, default_interval=3600):
+    """
+    设置feed轮询整形，在主应用中调用此函数
+
+    部署在反向代理之后时，TRUSTED_PROXY_HOPS指定可信代理的层数（默认1，如Render），
+    按X-Forwarded-For中从右数第N个地址识别客户端；直接对外提供服务时设为0
+
+    Args:
+        app: Flask应用实例
+        default_interval: 还没有计划更新时间时使用的缓存时间（秒）
+
+    Returns:
+        PollShaper实例
+    """
+    proxy_hops = int(os.environ.get('TRUSTED_PROXY_HOPS', 1))
+    if proxy_hops > 0:
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxy_hops)
+
+    shaper = PollShaper(
+        app,
+        default_interval=default_interval,
+        max_clients=int(os.environ.get('FEED_RATE_LIMIT_CLIENTS', 10000)),
+        burst=int(os.environ.get('FEED_RATE_LIMIT_BURST', 10)),
+        polls_per_hour=float(os.environ.get('FEED_RATE_LIMIT_PER_HOUR', 60))
+    )
+    if os.environ.get('FEED_RATE_LIMIT_ENABLED', '1').lower() not in ('0', 'false', 'no'):
+        shaper.add_rate_limit()
+    return shaper
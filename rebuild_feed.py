@@ -0,0 +1,200 @@
+import os
+import re
+import sys
+import time
+import logging
+import argparse
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from update_rss import RSSUpdater
+from article_archive import ARCHIVE_NAME, get_article_archive
+from persistence import get_article_restorer, write_file_atomically
+from image_cache import ImageCache, image_cache_dir
+from logging_config import configure_logging
+
+logger = logging.getLogger('rebuild_feed')
+
+# 默认的channel元信息，feed.xml无法解析时使用
+DEFAULT_CHANNEL = [
+    ('title', '晚点LatePost'),
+    ('link', 'https://www.latepost.com'),
+    ('description', '晚点LatePost的文章更新'),
+    ('docs', 'http://www.rssboard.org/rss-specification'),
+    ('generator', 'python-feedgen'),
+    ('language', 'zh-CN'),
+    ('lastBuildDate', ''),
+]
+
+# 工作进程内复用的RSS更新器
+_worker_updater = None
+
+
+def _init_worker(articles_dir, hub_url, self_url, cache_dir):
+    """初始化工作进程，开启图片缓存时只读加载其索引，保持图片地址指向/img/<hash>"""
+    global _worker_updater
+    image_cache = ImageCache(None, cache_dir=cache_dir) if cache_dir else None
+    _worker_updater = RSSUpdater(feed_path=os.devnull, articles_dir=articles_dir,
+                                 hub_url=hub_url, self_url=self_url, image_cache=image_cache)
+
+
+def _render_article(task):
+    """在工作进程中提取文章元信息并渲染item，返回(文章ID, item的XML)，失败时XML为None"""
+    article_id, content, now = task
+    article = _worker_updater._parse_article(content)
+    if not article:
+        return article_id, None
+    content, title, publish_date, author = article
+    item = ET.Element('item')
+    _worker_updater._fill_item(item, article_id, content, title, publish_date, author, now)
+    return article_id, ET.tostring(item, encoding='utf-8')
+
+
+class FeedRebuilder:
+    """从文章归档重新生成feed.xml，使用进程池并行渲染所有文章"""
+
+    def __init__(self, feed_path='feed.xml', articles_dir='latepost_articles', max_items=50,
+                 workers=None, hub_url=None, self_url=None, cache_dir=None):
+        """
+        初始化feed重建器
+
+        Args:
+            feed_path: 输出的feed.xml路径
+            articles_dir: 文章目录（包含Markdown文件或打包归档）
+            max_items: feed中保留的文章数量，None表示保留全部
+            workers: 进程数，默认使用CPU核数
+            hub_url: WebSub Hub地址
+            self_url: feed自身的公开地址
+            cache_dir: 图片缓存目录，用于将图片地址改写为本地缓存地址
+        """
+        self.feed_path = feed_path
+        self.articles_dir = articles_dir
+        self.max_items = max_items
+        self.workers = workers or os.cpu_count() or 1
+        self.hub_url = hub_url
+        self.self_url = self_url
+        self.cache_dir = cache_dir
+
+    def _collect_articles(self):
+        """扫描打包归档和单独的Markdown文件，返回{文章ID: Markdown内容}"""
+        articles = {}
+
+        # 文章目录可能位于临时磁盘上，先从Git仓库恢复
+        get_article_restorer(self.articles_dir).ensure_restored()
+
+        for filename in os.listdir(self.articles_dir):
+            match = re.match(r'latepost_article_(\d+)\.md$', filename)
+            if match:
+                with open(os.path.join(self.articles_dir, filename), 'r', encoding='utf-8') as f:
+                    articles[int(match.group(1))] = f.read()
+
+        # 归档中的版本优先于单独的Markdown文件
+        if os.path.exists(os.path.join(self.articles_dir, ARCHIVE_NAME)):
+            for article_id, content in get_article_archive(self.articles_dir).iter_articles():
+                articles[article_id] = content
+
+        return articles
+
+    def _create_channel_root(self):
+        """从现有feed.xml复制channel元信息，无法解析时使用默认值"""
+        try:
+            root = ET.parse(self.feed_path).getroot()
+            channel = root.find('channel')
+            for item in channel.findall('item'):
+                channel.remove(item)
+            return root
+        except Exception as e:
+            logger.warning(f"无法解析现有feed.xml，使用默认channel信息: {str(e)}")
+
+        root = ET.Element('rss', {'version': '2.0'})
+        channel = ET.SubElement(root, 'channel')
+        for tag, text in DEFAULT_CHANNEL:
+            ET.SubElement(channel, tag).text = text
+        return root
+
+    def rebuild(self):
+        """重建feed.xml，返回统计信息字典"""
+        start_time = time.perf_counter()
+        now = datetime.now().strftime('%a, %d %b %Y %H:%M:%S +0000')
+
+        articles = self._collect_articles()
+        scan_time = time.perf_counter() - start_time
+        logger.info(f"扫描到{len(articles)}篇文章，耗时{scan_time:.2f}秒")
+
+        # 按ID升序合并，与增量更新时的追加顺序一致
+        article_ids = sorted(articles)
+        if self.max_items:
+            article_ids = article_ids[-self.max_items:]
+        tasks = [(article_id, articles[article_id], now) for article_id in article_ids]
+
+        render_start = time.perf_counter()
+        chunksize = max(1, len(tasks) // (self.workers * 4))
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                 initargs=(self.articles_dir, self.hub_url, self.self_url, self.cache_dir)) as executor:
+            rendered = list(executor.map(_render_article, tasks, chunksize=chunksize))
+        render_time = time.perf_counter() - render_start
+
+        root = self._create_channel_root()
+        channel = root.find('channel')
+        channel.find('lastBuildDate').text = now
+        RSSUpdater(feed_path=self.feed_path, articles_dir=self.articles_dir,
+                   hub_url=self.hub_url, self_url=self.self_url)._ensure_hub_links(channel)
+
+        skipped = []
+        for article_id, item_xml in rendered:
+            if item_xml is None:
+                skipped.append(article_id)
+                continue
+            channel.append(ET.fromstring(item_xml))
+        if hasattr(ET, 'indent'):  # Python 3.9+
+            ET.indent(root, space='  ')
+
+        # 写入临时文件后原子替换
+        write_file_atomically(
+            self.feed_path,
+            lambda f: ET.ElementTree(root).write(f, encoding='utf-8', xml_declaration=True)
+        )
+
+        total_time = time.perf_counter() - start_time
+        stats = {
+            'articles': len(articles),
+            'rendered': len(rendered) - len(skipped),
+            'skipped': skipped,
+            'workers': self.workers,
+            'render_seconds': render_time,
+            'total_seconds': total_time,
+            'articles_per_second': len(rendered) / render_time if render_time > 0 else 0.0,
+        }
+        logger.info(
+            f"feed.xml重建完成: 渲染{stats['rendered']}篇，跳过{len(skipped)}篇，"
+            f"{self.workers}个进程，渲染耗时{render_time:.2f}秒"
+            f"（{stats['articles_per_second']:.0f}篇/秒），总耗时{total_time:.2f}秒"
+        )
+        return stats
+
+
+def main(argv=None):
+    configure_logging()
+    parser = argparse.ArgumentParser(description='从文章归档重新生成feed.xml')
+    parser.add_argument('--feed-path', default='feed.xml', help='输出的feed.xml路径')
+    parser.add_argument('--articles-dir', default='latepost_articles', help='文章目录')
+    parser.add_argument('--max-items', type=int, default=50, help='保留的文章数量，0表示保留全部')
+    parser.add_argument('--workers', type=int, default=None, help='进程数，默认使用CPU核数')
+    args = parser.parse_args(argv)
+
+    service_url = os.environ.get('SERVICE_URL', 'http://localhost:5000').rstrip('/')
+    rebuilder = FeedRebuilder(
+        feed_path=args.feed_path,
+        articles_dir=args.articles_dir,
+        max_items=args.max_items or None,
+        workers=args.workers,
+        hub_url=f"{service_url}/websub",
+        self_url=f"{service_url}/feed.xml",
+        cache_dir=image_cache_dir()
+    )
+    stats = rebuilder.rebuild()
+    return 0 if stats['rendered'] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,19 +1,39 @@
-import requests
-from bs4 import BeautifulSoup
 import os
 import time
 import random
+import logging
+import threading
 from datetime import datetime
+from article_archive import get_article_archive, use_packed_storage
+from fetch_engine import get_fetch_engine
+from sources import LATEPOST_SOURCE
+from logging_config import log_fields
+
+logger = logging.getLogger('simple_scraper')
 
 class SimpleLatePostScraper:
-    def __init__(self, output_dir="./latepost_articles"):
-        """初始化爬虫类"""
+    def __init__(self, output_dir="./latepost_articles", source=None, engine=None):
+        """初始化爬虫类
+        
+        Args:
+            output_dir: 文章保存目录
+            source: 文章来源，默认为晚点LatePost
+            engine: 抓取引擎，默认使用进程内共享的引擎
+        """
         self.output_dir = output_dir
+        self.source = source or LATEPOST_SOURCE
+        self.engine = engine or get_fetch_engine()
+        # 目标网站正常响应（非异常、非5xx）的请求数，用于区分"没有新文章"和"网站不可用"
+        self.responded = 0
+        self.responded_lock = threading.Lock()
         
         # 创建输出目录
         if not os.path.exists(output_dir):
             os.makedirs(output_dir)
         
+        # 启用打包归档时写入单个归档文件，否则每篇文章保存为单独的Markdown文件
+        self.archive = get_article_archive(output_dir) if use_packed_storage() else None
+        
         # 设置更真实的用户代理
         self.user_agents = [
             'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
@@ -33,76 +53,40 @@ class SimpleLatePostScraper:
     
     def scrape_article(self, article_id):
         """爬取单篇文章"""
-        url = f"https://www.latepost.com/news/dj_detail?id={article_id}"
+        url = self.source.article_url(article_id)
+        start_time = time.perf_counter()
         
         try:
-            print(f"正在爬取文章 ID: {article_id}")
-            
-            # 添加随机延迟，模拟人类行为
-            time.sleep(random.uniform(1, 3))
-            
-            # 发送请求
-            response = requests.get(url, headers=self.get_headers(), timeout=15)
+            # 发送请求（抓取引擎对同一主机保持随机间隔，模拟人类行为）
+            response = self.engine.fetch(url, headers=self.get_headers())
+            if response.status_code < 500:
+                with self.responded_lock:
+                    self.responded += 1
             
             # 检查响应状态
             if response.status_code != 200:
-                print(f"请求失败，状态码: {response.status_code}，ID: {article_id}")
-                return None
-            
-            # 解析HTML
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # 提取文章标题
-            title_element = soup.select_one('.article-header-title')
-            if not title_element:
-                print(f"警告: 无法找到文章标题，ID: {article_id}")
+                logger.info(f"请求失败，状态码: {response.status_code}，ID: {article_id}",
+                            extra=log_fields(article_id, 'scrape', time.perf_counter() - start_time,
+                                             self.source.name, sampled=True))
                 return None
             
-            title = title_element.text.strip()
-            
-            # 提取文章发布日期
-            date_element = soup.select_one('.article-header-date')
-            publish_date = date_element.text.strip() if date_element else "未知日期"
-            
-            # 提取作者信息
-            author_elements = soup.select('.article-header-author .author-link .cursor')
-            authors = [author.text.strip() for author in author_elements if author.text.strip()]
-            author_info = "、".join(authors) if authors else "未知作者"
-            
-            # 提取文章正文
-            article_body = soup.select_one('.article-body.ql-editor')
-            if not article_body:
-                print(f"警告: 无法找到文章正文，ID: {article_id}")
+            # 使用来源的提取器解析HTML
+            article_data = self.source.extractor(response.text)
+            if not article_data:
+                logger.warning(f"无法找到文章标题或正文，ID: {article_id}",
+                               extra=log_fields(article_id, 'scrape', source=self.source.name))
                 return None
             
-            # 提取所有段落和图片
-            content_elements = []
-            
-            for element in article_body.find_all(['p', 'img', 'blockquote']):
-                if element.name == 'p':
-                    text = element.text.strip()
-                    if text:  # 只添加非空段落
-                        content_elements.append(('text', text))
-                elif element.name == 'img':
-                    img_src = element.get('src', '')
-                    if img_src:
-                        content_elements.append(('image', img_src))
-                elif element.name == 'blockquote':
-                    quote_text = element.text.strip()
-                    if quote_text:
-                        content_elements.append(('quote', quote_text))
-            
-            return {
-                'id': article_id,
-                'title': title,
-                'date': publish_date,
-                'author': author_info,
-                'content_elements': content_elements,
-                'url': url
-            }
+            article_data['id'] = article_id
+            article_data['url'] = url
+            logger.info(f"已爬取文章，ID: {article_id}",
+                        extra=log_fields(article_id, 'scrape', time.perf_counter() - start_time,
+                                         self.source.name, sampled=True))
+            return article_data
             
         except Exception as e:
-            print(f"爬取文章出错，ID: {article_id}, 错误: {str(e)}")
+            logger.error(f"爬取文章出错，ID: {article_id}, 错误: {str(e)}",
+                         extra=log_fields(article_id, 'scrape', source=self.source.name))
             return None
     
     def convert_to_markdown(self, article_data):
@@ -142,46 +126,76 @@ class SimpleLatePostScraper:
         if not markdown_content:
             return False
         
+        start_time = time.perf_counter()
+        if self.archive is not None:
+            try:
+                self.archive.put(article_id, markdown_content)
+                logger.info(f"文章已保存到归档: {self.archive.archive_path}，ID: {article_id}",
+                            extra=log_fields(article_id, 'save', time.perf_counter() - start_time,
+                                             self.source.name, sampled=True))
+                return True
+            except Exception as e:
+                logger.error(f"保存文章到归档出错，ID: {article_id}, 错误: {str(e)}",
+                             extra=log_fields(article_id, 'save', source=self.source.name))
+                return False
+        
         filename = os.path.join(self.output_dir, f"latepost_article_{article_id}.md")
         
         try:
             with open(filename, 'w', encoding='utf-8') as f:
                 f.write(markdown_content)
-            print(f"文章已保存: {filename}")
+            logger.info(f"文章已保存: {filename}",
+                        extra=log_fields(article_id, 'save', time.perf_counter() - start_time,
+                                         self.source.name, sampled=True))
             return True
         except Exception as e:
-            print(f"保存文章出错，ID: {article_id}, 错误: {str(e)}")
+            logger.error(f"保存文章出错，ID: {article_id}, 错误: {str(e)}",
+                         extra=log_fields(article_id, 'save', source=self.source.name))
             return False
     
-    def scrape_articles_range(self, start_id, end_id):
-        """爬取指定范围内的所有文章"""
+    def _scrape_and_save(self, article_id):
+        """爬取、转换并保存单篇文章，返回是否成功"""
+        article_data = self.scrape_article(article_id)
+        if not article_data:
+            return False
+        
+        # 转换为markdown并保存
+        markdown_content = self.convert_to_markdown(article_data)
+        return self.save_markdown(article_id, markdown_content)
+    
+    def scrape_articles(self, article_ids):
+        """通过抓取引擎并发爬取指定的文章"""
         results = {
             'success': [],
-            'failed': []
+            'failed': [],
+            'responded': 0  # 本批中目标网站正常响应的请求数
         }
         
-        for article_id in range(start_id, end_id + 1):
-            # 爬取文章
-            article_data = self.scrape_article(article_id)
-            
-            if article_data:
-                # 转换为markdown
-                markdown_content = self.convert_to_markdown(article_data)
-                
-                # 保存文章
-                if self.save_markdown(article_id, markdown_content):
-                    results['success'].append(article_id)
-                else:
-                    results['failed'].append(article_id)
-            else:
-                results['failed'].append(article_id)
-            
-            # 添加随机延迟，避免被检测
-            time.sleep(random.uniform(2, 5))
+        start_time = time.perf_counter()
+        article_ids = list(article_ids)
+        responded_before = self.responded
+        for article_id, succeeded in zip(article_ids, self.engine.map(self._scrape_and_save, article_ids)):
+            results['success' if succeeded else 'failed'].append(article_id)
+        results['responded'] = self.responded - responded_before
         
+        # 每批一条汇总日志（不抽样），用于统计吞吐量
+        logger.info(f"本批爬取完成: 成功{len(results['success'])}篇，失败{len(results['failed'])}篇",
+                    extra=log_fields(stage='batch', duration=time.perf_counter() - start_time,
+                                     source=self.source.name, count=len(article_ids)))
         return results
+    
+    def scrape_articles_range(self, start_id, end_id):
+        """爬取指定范围内的所有文章"""
+        return self.scrape_articles(range(start_id, end_id + 1))
+    
+    def discover_and_scrape(self, high_water):
+        """使用来源的发现策略找出高水位之后的新文章并爬取"""
+        return self.scrape_articles(self.source.discovery.candidates(high_water, self.engine))
 
 def main():
+    from logging_config import configure_logging
+    configure_logging()
+    
     # 创建爬虫实例
     scraper = SimpleLatePostScraper(output_dir="./latepost_articles")
     
@@ -0,0 +1,223 @@
+import os
+import re
+import json
+import logging
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+logger = logging.getLogger('sources')
+
+
+class SelectorExtractor:
+    """基于CSS选择器的文章提取器，从文章页面HTML中提取标题、日期、作者和正文"""
+
+    def __init__(self, title, body, date=None, authors=None):
+        """
+        初始化提取器
+
+        Args:
+            title: 标题元素选择器
+            body: 正文容器选择器
+            date: 发布日期元素选择器
+            authors: 作者元素选择器（可匹配多个）
+        """
+        self.title = title
+        self.body = body
+        self.date = date
+        self.authors = authors
+
+    def __call__(self, html):
+        """提取文章数据，缺少标题或正文时返回None"""
+        from bs4 import BeautifulSoup  # 延迟导入，缩短服务启动时间
+
+        soup = BeautifulSoup(html, 'html.parser')
+
+        # 提取文章标题
+        title_element = soup.select_one(self.title)
+        if not title_element:
+            return None
+
+        # 提取文章发布日期
+        date_element = soup.select_one(self.date) if self.date else None
+        publish_date = date_element.text.strip() if date_element else "未知日期"
+
+        # 提取作者信息
+        author_elements = soup.select(self.authors) if self.authors else []
+        authors = [author.text.strip() for author in author_elements if author.text.strip()]
+
+        # 提取文章正文
+        article_body = soup.select_one(self.body)
+        if not article_body:
+            return None
+
+        # 提取所有段落和图片
+        content_elements = []
+        for element in article_body.find_all(['p', 'img', 'blockquote']):
+            if element.name == 'p':
+                text = element.text.strip()
+                if text:  # 只添加非空段落
+                    content_elements.append(('text', text))
+            elif element.name == 'img':
+                img_src = element.get('src', '')
+                if img_src:
+                    content_elements.append(('image', img_src))
+            elif element.name == 'blockquote':
+                quote_text = element.text.strip()
+                if quote_text:
+                    content_elements.append(('quote', quote_text))
+
+        return {
+            'title': title_element.text.strip(),
+            'date': publish_date,
+            'author': "、".join(authors) if authors else "未知作者",
+            'content_elements': content_elements
+        }
+
+
+class IdRangeDiscovery:
+    """按递增ID发现新文章：从高水位之后依次尝试batch个ID"""
+
+    def __init__(self, batch=10):
+        """初始化ID范围发现策略"""
+        self.batch = batch
+
+    def candidates(self, high_water, engine):
+        """返回待爬取的文章ID列表"""
+        return list(range(high_water + 1, high_water + self.batch + 1))
+
+
+class ListingPageDiscovery:
+    """从列表页发现新文章：抓取列表页，提取大于高水位的文章ID"""
+
+    def __init__(self, listing_url, id_pattern=r'id=(\d+)', limit=20):
+        """
+        初始化列表页发现策略
+
+        Args:
+            listing_url: 列表页地址
+            id_pattern: 从页面中提取文章ID的正则表达式
+            limit: 每次最多返回的文章数量
+        """
+        self.listing_url = listing_url
+        self.id_pattern = re.compile(id_pattern)
+        self.limit = limit
+
+    def candidates(self, high_water, engine):
+        """返回待爬取的文章ID列表（升序）"""
+        try:
+            response = engine.fetch(self.listing_url)
+            if response.status_code != 200:
+                logger.warning(f"列表页请求失败，状态码: {response.status_code}，URL: {self.listing_url}")
+                return []
+            ids = {int(match) for match in self.id_pattern.findall(response.text)}
+        except Exception as e:
+            logger.error(f"抓取列表页出错: {self.listing_url}，错误: {str(e)}")
+            return []
+        return sorted(article_id for article_id in ids if article_id > high_water)[:self.limit]
+
+
+class Source:
+    """文章来源：定义文章地址模板、提取器、发现策略、更新间隔以及对应的feed"""
+
+    def __init__(self, name, url_template, extractor, discovery, interval=3600,
+                 feed_path=None, articles_dir=None, title=None, link=None, description=None, start_id=0):
+        """
+        初始化文章来源
+
+        Args:
+            name: 来源名称，同时用于feed路径 /feeds/<name>.xml
+            url_template: 文章地址模板，包含{article_id}占位符
+            extractor: 文章提取器，接收HTML返回文章数据
+            discovery: 新文章发现策略
+            interval: 更新间隔（秒）
+            feed_path: feed文件路径，默认为feeds/<name>.xml
+            articles_dir: 文章保存目录，默认为<name>_articles
+            title: feed标题
+            link: feed对应的网站地址
+            description: feed描述
+            start_id: feed中还没有文章时使用的初始高水位
+        """
+        self.name = name
+        self.url_template = url_template
+        self.extractor = extractor
+        self.discovery = discovery
+        self.interval = interval
+        self.feed_path = feed_path or os.path.join('feeds', f'{name}.xml')
+        self.articles_dir = articles_dir or f'{name}_articles'
+        self.title = title or name
+        parsed_url = urlparse(url_template)
+        self.link = link or f"{parsed_url.scheme}://{parsed_url.netloc}"
+        self.description = description or f'{self.title}的文章更新'
+        self.start_id = start_id
+
+    def article_url(self, article_id):
+        """返回文章地址"""
+        return self.url_template.format(article_id=article_id)
+
+
+# 晚点LatePost默认来源，保持原有的feed.xml和latepost_articles路径
+LATEPOST_SOURCE = Source(
+    name='latepost',
+    url_template='https://www.latepost.com/news/dj_detail?id={article_id}',
+    extractor=SelectorExtractor(
+        title='.article-header-title',
+        date='.article-header-date',
+        authors='.article-header-author .author-link .cursor',
+        body='.article-body.ql-editor'
+    ),
+    discovery=IdRangeDiscovery(batch=10),
+    interval=3600,
+    feed_path='feed.xml',
+    articles_dir='latepost_articles',
+    title='晚点LatePost',
+    link='https://www.latepost.com',
+    description='晚点LatePost的文章更新'
+)
+
+SOURCES = OrderedDict()
+
+
+def register_source(source):
+    """注册文章来源，同名来源会被覆盖"""
+    SOURCES[source.name] = source
+    return source
+
+
+def _source_from_config(config):
+    """根据配置字典创建来源"""
+    discovery_config = dict(config.get('discovery', {'type': 'id_range'}))
+    discovery_type = discovery_config.pop('type', 'id_range')
+    if discovery_type == 'listing':
+        discovery = ListingPageDiscovery(**discovery_config)
+    else:
+        discovery = IdRangeDiscovery(**discovery_config)
+
+    return Source(
+        name=config['name'],
+        url_template=config['url_template'],
+        extractor=SelectorExtractor(**config['selectors']),
+        discovery=discovery,
+        interval=config.get('interval', 3600),
+        feed_path=config.get('feed_path'),
+        articles_dir=config.get('articles_dir'),
+        title=config.get('title'),
+        link=config.get('link'),
+        description=config.get('description'),
+        start_id=config.get('start_id', 0)
+    )
+
+
+def load_sources(config_path=None):
+    """注册默认来源和配置文件（SOURCES_CONFIG）中的其他来源，返回来源列表"""
+    register_source(LATEPOST_SOURCE)
+
+    config_path = config_path or os.environ.get('SOURCES_CONFIG')
+    if config_path:
+        try:
+            with open(config_path, 'r', encoding='utf-8') as f:
+                for config in json.load(f):
+                    register_source(_source_from_config(config))
+        except Exception as e:
+            logger.error(f"加载来源配置失败: {config_path}，错误: {str(e)}")
+
+    return list(SOURCES.values())
@@ -0,0 +1,141 @@
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import statistics
+import subprocess
+import threading
+from datetime import datetime
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _free_port():
+    """获取一个空闲端口"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _port_bound(port):
+    """判断端口是否已经可以连接"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.settimeout(0.05)
+        return sock.connect_ex(('127.0.0.1', port)) == 0
+
+
+def parse_importtime(lines):
+    """解析-X importtime输出，返回[(模块名, 自身耗时us, 累计耗时us, 层级)]，顶层导入的层级为0"""
+    records = []
+    for line in lines:
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line.split(':', 1)[1].split('|', 2)
+            self_us = int(self_us.strip())
+            cumulative_us = int(cumulative_us.strip())
+        except ValueError:
+            continue
+        name = name.rstrip('\n')
+        level = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        records.append((name.strip(), self_us, cumulative_us, level))
+    return records
+
+
+def run_once(timeout=30):
+    """启动一次服务，返回(绑定端口耗时秒数, importtime记录)"""
+    port = _free_port()
+    env = dict(os.environ)
+    env.update({
+        'PORT': str(port),
+        'SERVICE_URL': f'http://127.0.0.1:{port}',
+        'RSS_UPDATE_ENABLED': '0',  # 只测量启动，不爬取文章
+        'LEADER_LEASE_STORE': 'file',
+    })
+    for key in ('GIT_REPO_URL', 'GIT_USERNAME', 'GIT_EMAIL', 'GIT_TOKEN'):
+        env.pop(key, None)
+
+    start_time = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, '-X', 'importtime', 'main.py'],
+        cwd=ROOT_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True
+    )
+
+    # 后台读取stderr，避免管道写满阻塞子进程
+    stderr_lines = []
+    reader = threading.Thread(target=lambda: stderr_lines.extend(process.stderr), daemon=True)
+    reader.start()
+
+    elapsed = None
+    try:
+        while time.perf_counter() - start_time < timeout:
+            if _port_bound(port):
+                elapsed = time.perf_counter() - start_time
+                break
+            if process.poll() is not None:
+                break
+            time.sleep(0.01)
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+        reader.join(timeout=5)
+
+    if elapsed is None:
+        tail = ''.join(line for line in stderr_lines if not line.startswith('import time:'))[-2000:]
+        raise RuntimeError(f"服务在{timeout}秒内未绑定端口:\n{tail}")
+
+    return elapsed, parse_importtime(stderr_lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='测量服务启动到绑定端口的时间和模块导入耗时')
+    parser.add_argument('--runs', type=int, default=3, help='运行次数，取中位数')
+    parser.add_argument('--top', type=int, default=15, help='显示累计导入耗时最多的模块数量')
+    parser.add_argument('--budget', type=float, default=None, help='启动时间预算（秒），超出时返回非零退出码')
+    parser.add_argument('--record', default=None, help='将结果以JSON行追加写入指定文件')
+    args = parser.parse_args(argv)
+
+    timings = []
+    imports = []
+    for run in range(1, args.runs + 1):
+        elapsed, imports = run_once()
+        timings.append(elapsed)
+        print(f"第{run}次: 绑定端口耗时{elapsed * 1000:.0f}ms")
+
+    median = statistics.median(timings)
+    top_level = [record for record in imports if record[3] == 0]
+    import_total_us = sum(record[2] for record in top_level)
+
+    print(f"\n启动到绑定端口耗时（中位数）: {median * 1000:.0f}ms")
+    print(f"模块导入总耗时（最后一次运行）: {import_total_us / 1000:.0f}ms")
+    print(f"\n累计导入耗时最多的{args.top}个顶层模块:")
+    for name, _, cumulative_us, _ in sorted(top_level, key=lambda r: r[2], reverse=True)[:args.top]:
+        print(f"  {cumulative_us / 1000:8.1f}ms  {name}")
+
+    if args.record:
+        with open(args.record, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({
+                'timestamp': datetime.now().isoformat(),
+                'time_to_port_ms': round(median * 1000, 1),
+                'runs_ms': [round(t * 1000, 1) for t in timings],
+                'import_total_ms': round(import_total_us / 1000, 1),
+            }) + '\n')
+
+    if args.budget is not None and median > args.budget:
+        print(f"\n启动时间{median:.2f}秒超出预算{args.budget:.2f}秒")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
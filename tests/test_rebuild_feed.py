@@ -0,0 +1,27 @@
+import os
+import shutil
+import xml.etree.ElementTree as ET
+
+from rebuild_feed import FeedRebuilder
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_rebuild_from_markdown_articles(tmp_path, monkeypatch):
+    """在文章目录的临时副本上完整运行一次重建"""
+    # 不连接Git仓库，恢复器直接视为已恢复
+    for key in ('GIT_REPO_URL', 'GIT_USERNAME', 'GIT_EMAIL', 'GIT_TOKEN', 'ARTICLE_STORAGE'):
+        monkeypatch.delenv(key, raising=False)
+
+    articles_dir = tmp_path / 'latepost_articles'
+    shutil.copytree(os.path.join(ROOT_DIR, 'latepost_articles'), articles_dir)
+    article_count = len([name for name in os.listdir(articles_dir) if name.endswith('.md')])
+    feed_path = tmp_path / 'feed.xml'
+    shutil.copy(os.path.join(ROOT_DIR, 'feed.xml'), feed_path)
+
+    stats = FeedRebuilder(feed_path=str(feed_path), articles_dir=str(articles_dir), workers=2).rebuild()
+
+    assert stats['rendered'] == article_count
+    channel = ET.parse(feed_path).getroot().find('channel')
+    assert len(channel.findall('item')) == article_count
+    assert channel.find('lastBuildDate').text
@@ -3,20 +3,45 @@ import logging
 import xml.etree.ElementTree as ET
 from datetime import datetime
 import re
-from persistence import GitRepository
+import json
+import hashlib
+from persistence import GitRepository, HASHES_NAME, get_article_restorer, write_file_atomically
+from article_archive import ARCHIVE_NAME, get_article_archive, load_article_markdown, use_packed_storage
+from sources import LATEPOST_SOURCE
 
-# 配置日志
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger('update_rss')
 
+ATOM_NS = 'http://www.w3.org/2005/Atom'
+ET.register_namespace('atom', ATOM_NS)
+
 class RSSUpdater:
     """RSS更新器，用于更新feed.xml文件"""
     
-    def __init__(self, feed_path='feed.xml', articles_dir='latepost_articles'):
+    def __init__(self, feed_path='feed.xml', articles_dir='latepost_articles', hub_url=None, self_url=None,
+                 image_cache=None, auto_sync=True, article_url_template=None, ttl=None):
         """初始化RSS更新器"""
         self.feed_path = feed_path
         self.articles_dir = articles_dir
+        self.article_url_template = article_url_template or LATEPOST_SOURCE.url_template  # 文章地址模板，用于link和guid
+        # 从文章地址中提取ID的正则表达式
+        self.article_id_pattern = re.compile(
+            re.escape(self.article_url_template).replace(re.escape('{article_id}'), r'(\d+)')
+        )
+        self.hub_url = hub_url  # WebSub Hub地址
+        self.self_url = self_url  # feed自身的公开地址
+        self.image_cache = image_cache  # 可选的图片缓存，用于改写图片地址
+        self.ttl = ttl  # 建议客户端的轮询间隔（分钟），写入channel的<ttl>元素
         self.max_items = 50  # 最大保留文章数量
+        self.hashes_path = os.path.join(articles_dir, HASHES_NAME)  # 文章和feed的内容哈希
+        self.feed_changed = False  # 最近一次更新是否实际修改了feed.xml
+        self.edited_article_ids = []  # 最近一次重新检查中内容发生变化的文章
+        self.auto_sync = auto_sync  # 写入feed.xml后是否立即同步到Git仓库，调用方自行批量同步时关闭
+        
+        # 打包归档存在或已启用时，优先从归档读取文章
+        if use_packed_storage() or os.path.exists(os.path.join(articles_dir, ARCHIVE_NAME)):
+            self.archive = get_article_archive(articles_dir)
+        else:
+            self.archive = None
     
     def get_latest_article_id(self):
         """从feed.xml中获取最新文章ID"""
@@ -41,7 +66,7 @@ class RSSUpdater:
             for link in links:
                 url = link.text
                 # 使用正则表达式提取ID
-                match = re.search(r'id=(\d+)', url)
+                match = self.article_id_pattern.search(url or '')
                 if match:
                     article_ids.append(int(match.group(1)))
             
@@ -58,6 +83,32 @@ class RSSUpdater:
             logger.error(f"获取最新文章ID时出错: {str(e)}")
             return None
     
+    def ensure_feed(self, title, link, description):
+        """feed文件不存在时创建只包含channel元信息的空feed，用于新接入的来源"""
+        if os.path.exists(self.feed_path):
+            return False
+        
+        root = ET.Element('rss', {'version': '2.0'})
+        channel = ET.SubElement(root, 'channel')
+        for tag, text in [
+            ('title', title),
+            ('link', link),
+            ('description', description),
+            ('docs', 'http://www.rssboard.org/rss-specification'),
+            ('generator', 'python-feedgen'),
+            ('language', 'zh-CN'),
+            ('lastBuildDate', datetime.now().strftime('%a, %d %b %Y %H:%M:%S +0000')),
+        ]:
+            ET.SubElement(channel, tag).text = text
+        self._ensure_ttl(channel)
+        
+        write_file_atomically(
+            self.feed_path,
+            lambda f: ET.ElementTree(root).write(f, encoding='utf-8', xml_declaration=True)
+        )
+        logger.info(f"已创建空feed: {self.feed_path}")
+        return True
+    
     def count_items(self, root):
         """计算feed.xml中的文章数量"""
         items = root.findall('.//item')
@@ -65,6 +116,7 @@ class RSSUpdater:
     
     def update_feed(self, new_article_ids):
         """更新feed.xml，添加新文章"""
+        self.feed_changed = False
         try:
             if not os.path.exists(self.feed_path):
                 logger.error(f"feed.xml文件不存在: {self.feed_path}")
@@ -74,78 +126,27 @@ class RSSUpdater:
             tree = ET.parse(self.feed_path)
             root = tree.getroot()
             channel = root.find('channel')
+            hashes = self._load_hashes()
+            original_hash = self._feed_hash(channel)
             
-            # 更新lastBuildDate
-            last_build_date = channel.find('lastBuildDate')
             now = datetime.now().strftime('%a, %d %b %Y %H:%M:%S +0000')
-            last_build_date.text = now
+            
+            # 声明WebSub Hub地址和建议的轮询间隔
+            self._ensure_hub_links(channel)
+            self._ensure_ttl(channel)
             
             # 添加新文章
             articles_added = 0
             for article_id in new_article_ids:
-                article_path = os.path.join(self.articles_dir, f"latepost_article_{article_id}.md")
-                
-                if not os.path.exists(article_path):
-                    logger.warning(f"文章文件不存在: {article_path}")
-                    continue
-                
-                # 读取文章内容
-                with open(article_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                
-                # 提取标题、日期和作者
-                title_match = re.search(r'# (.+)', content)
-                date_match = re.search(r'\*\*发布日期\*\*: (.+)', content)
-                author_match = re.search(r'\*\*作者\*\*: (.+)', content)
-                
-                if not title_match:
-                    logger.warning(f"无法从文章中提取标题: {article_path}")
+                article = self._read_article(article_id)
+                if not article:
                     continue
-                
-                title = title_match.group(1).strip()
-                publish_date = date_match.group(1).strip() if date_match else "未知日期"
-                author = author_match.group(1).strip() if author_match else "未知作者"
+                content, title, publish_date, author = article
                 
                 # 创建新的item元素
                 item = ET.SubElement(channel, 'item')
-                
-                # 添加标题
-                title_elem = ET.SubElement(item, 'title')
-                title_elem.text = title
-                
-                # 添加链接
-                link_elem = ET.SubElement(item, 'link')
-                link_elem.text = f"https://www.latepost.com/news/dj_detail?id={article_id}"
-                
-                # 添加描述（HTML格式）
-                desc_elem = ET.SubElement(item, 'description')
-                
-                # 创建HTML格式的描述
-                html_content = self._create_html_description(content, title, publish_date, author)
-                desc_elem.text = html_content
-                
-                # 添加发布日期
-                pubdate_elem = ET.SubElement(item, 'pubDate')
-                try:
-                    # 尝试解析中文日期格式并转换为RSS标准格式
-                    date_parts = publish_date.split(' ')
-                    if len(date_parts) >= 2:
-                        date_str = date_parts[0].replace('月', '/').replace('日', '')
-                        time_str = date_parts[1]
-                        dt = datetime.strptime(f"{date_str} {time_str}", "%m/%d %H:%M")
-                        # 使用当前年份
-                        current_year = datetime.now().year
-                        dt = dt.replace(year=current_year)
-                        pubdate_elem.text = dt.strftime('%a, %d %b %Y %H:%M:%S +0000')
-                    else:
-                        pubdate_elem.text = now  # 使用当前时间作为后备
-                except Exception as e:
-                    logger.warning(f"日期解析失败: {str(e)}，使用当前时间")
-                    pubdate_elem.text = now
-                
-                # 添加GUID
-                guid_elem = ET.SubElement(item, 'guid')
-                guid_elem.text = f"https://www.latepost.com/news/dj_detail?id={article_id}"
+                self._fill_item(item, article_id, content, title, publish_date, author, now)
+                hashes['articles'][str(article_id)] = self._content_hash(content)
                 
                 articles_added += 1
                 logger.info(f"已添加文章: {title} (ID: {article_id})")
@@ -179,12 +180,16 @@ class RSSUpdater:
                     logger.info(f"删除旧文章: {title_text}")
                     channel.remove(item)
             
-            # 保存更新后的feed.xml
-            tree.write(self.feed_path, encoding='utf-8', xml_declaration=True)
+            # 内容没有变化时跳过写入和推送
+            if not self._write_if_changed(tree, channel, original_hash, hashes, now):
+                logger.info("feed.xml内容没有变化，跳过写入和同步")
+                return True
+            
             logger.info(f"成功更新feed.xml，添加了{articles_added}篇新文章")
             
             # 同步到Git仓库
-            self._sync_to_git_repository()
+            if self.auto_sync:
+                self._sync_to_git_repository()
             
             return True
             
@@ -192,6 +197,256 @@ class RSSUpdater:
             logger.error(f"更新feed.xml时出错: {str(e)}")
             return False
     
+    def _read_article(self, article_id):
+        """读取文章并提取内容、标题、日期和作者，失败时返回None"""
+        content = load_article_markdown(self.articles_dir, article_id, self.archive)
+        if content is None:
+            logger.warning(f"文章不存在，ID: {article_id}")
+            return None
+        
+        article = self._parse_article(content)
+        if not article:
+            logger.warning(f"无法从文章中提取标题，ID: {article_id}")
+        return article
+    
+    def _parse_article(self, content):
+        """从Markdown内容中提取标题、日期和作者，没有标题时返回None"""
+        # 提取标题、日期和作者
+        title_match = re.search(r'# (.+)', content)
+        date_match = re.search(r'\*\*发布日期\*\*: (.+)', content)
+        author_match = re.search(r'\*\*作者\*\*: (.+)', content)
+        
+        if not title_match:
+            return None
+        
+        title = title_match.group(1).strip()
+        publish_date = date_match.group(1).strip() if date_match else "未知日期"
+        author = author_match.group(1).strip() if author_match else "未知作者"
+        return content, title, publish_date, author
+    
+    def _fill_item(self, item, article_id, content, title, publish_date, author, now):
+        """填充item元素的标题、链接、描述、发布日期和GUID"""
+        # 添加标题
+        title_elem = ET.SubElement(item, 'title')
+        title_elem.text = title
+        
+        # 添加链接
+        link_elem = ET.SubElement(item, 'link')
+        link_elem.text = self.article_url_template.format(article_id=article_id)
+        
+        # 添加描述（HTML格式）
+        desc_elem = ET.SubElement(item, 'description')
+        
+        # 创建HTML格式的描述
+        html_content = self._create_html_description(content, title, publish_date, author)
+        desc_elem.text = html_content
+        
+        # 添加发布日期
+        pubdate_elem = ET.SubElement(item, 'pubDate')
+        try:
+            # 尝试解析中文日期格式并转换为RSS标准格式
+            date_parts = publish_date.split(' ')
+            if len(date_parts) >= 2:
+                date_str = date_parts[0].replace('月', '/').replace('日', '')
+                time_str = date_parts[1]
+                dt = datetime.strptime(f"{date_str} {time_str}", "%m/%d %H:%M")
+                # 使用当前年份
+                current_year = datetime.now().year
+                dt = dt.replace(year=current_year)
+                pubdate_elem.text = dt.strftime('%a, %d %b %Y %H:%M:%S +0000')
+            else:
+                pubdate_elem.text = now  # 使用当前时间作为后备
+        except Exception as e:
+            logger.warning(f"日期解析失败: {str(e)}，使用当前时间")
+            pubdate_elem.text = now
+        
+        # 添加GUID
+        guid_elem = ET.SubElement(item, 'guid')
+        guid_elem.text = self.article_url_template.format(article_id=article_id)
+    
+    def _content_hash(self, content):
+        """计算内容的SHA-256哈希"""
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        return hashlib.sha256(content).hexdigest()
+    
+    def _feed_hash(self, channel):
+        """计算feed内容哈希，忽略lastBuildDate和空白"""
+        digest = hashlib.sha256()
+        for elem in channel.iter():
+            if elem.tag == 'lastBuildDate':
+                continue
+            digest.update(elem.tag.encode('utf-8'))
+            digest.update(json.dumps(sorted(elem.attrib.items()), ensure_ascii=False).encode('utf-8'))
+            digest.update((elem.text or '').strip().encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+    
+    def _load_hashes(self):
+        """加载文章和feed的内容哈希"""
+        # 重新部署后本地哈希文件缺失，先从Git仓库恢复，避免新写入的文件在推送时覆盖远程的完整历史
+        if not os.path.exists(self.hashes_path):
+            get_article_restorer(self.articles_dir).ensure_restored()
+        try:
+            with open(self.hashes_path, 'r', encoding='utf-8') as f:
+                hashes = json.load(f)
+        except FileNotFoundError:
+            hashes = {}
+        except Exception as e:
+            logger.warning(f"加载内容哈希失败: {str(e)}")
+            hashes = {}
+        hashes.setdefault('articles', {})
+        hashes.setdefault('feed', None)
+        return hashes
+    
+    def _save_hashes(self, hashes):
+        """保存文章和feed的内容哈希"""
+        try:
+            os.makedirs(self.articles_dir, exist_ok=True)
+            with open(self.hashes_path, 'w', encoding='utf-8') as f:
+                json.dump(hashes, f, ensure_ascii=False, indent=2)
+        except Exception as e:
+            logger.warning(f"保存内容哈希失败: {str(e)}")
+    
+    def _write_if_changed(self, tree, channel, original_hash, hashes, now):
+        """feed内容发生变化时更新lastBuildDate并写入feed.xml，返回是否写入"""
+        new_hash = self._feed_hash(channel)
+        self.feed_changed = new_hash != original_hash
+        if not self.feed_changed:
+            self._save_hashes(hashes)
+            return False
+        
+        # 更新lastBuildDate
+        last_build_date = channel.find('lastBuildDate')
+        last_build_date.text = now
+        
+        # 保存更新后的feed.xml（原子替换，正在提供服务的请求不会读到写了一半的文件）
+        write_file_atomically(
+            self.feed_path,
+            lambda f: tree.write(f, encoding='utf-8', xml_declaration=True)
+        )
+        hashes['feed'] = new_hash
+        self._save_hashes(hashes)
+        return True
+    
+    def refresh_recent_articles(self, scraper, count=5):
+        """重新爬取最近发布的文章，内容哈希变化时更新文章文件和feed中的条目
+        
+        Returns:
+            是否有文章内容发生变化并写入feed.xml
+        """
+        self.feed_changed = False
+        self.edited_article_ids = []
+        try:
+            if not os.path.exists(self.feed_path):
+                logger.error(f"feed.xml文件不存在: {self.feed_path}")
+                return False
+            
+            tree = ET.parse(self.feed_path)
+            channel = tree.getroot().find('channel')
+            hashes = self._load_hashes()
+            original_hash = self._feed_hash(channel)
+            now = datetime.now().strftime('%a, %d %b %Y %H:%M:%S +0000')
+            
+            # 找出feed中最新的几篇文章
+            items_by_id = {}
+            for item in channel.findall('item'):
+                link = item.find('link')
+                match = self.article_id_pattern.search(link.text or '') if link is not None else None
+                if match:
+                    items_by_id[int(match.group(1))] = item
+            recent_ids = sorted(items_by_id, reverse=True)[:count]
+            
+            edited = 0
+            for article_id in recent_ids:
+                markdown_content = scraper.convert_to_markdown(scraper.scrape_article(article_id))
+                if not markdown_content:
+                    continue
+                
+                new_hash = self._content_hash(markdown_content)
+                old_hash = hashes['articles'].get(str(article_id))
+                if old_hash is None:
+                    article = self._read_article(article_id)
+                    old_hash = self._content_hash(article[0]) if article else None
+                if new_hash == old_hash:
+                    continue
+                
+                # 文章内容发生变化，保存并重新渲染条目
+                if not scraper.save_markdown(article_id, markdown_content):
+                    continue
+                article = self._read_article(article_id)
+                if not article:
+                    continue
+                content, title, publish_date, author = article
+                
+                item = items_by_id[article_id]
+                old_pubdate = item.find('pubDate')
+                old_pubdate = old_pubdate.text if old_pubdate is not None else now
+                for child in list(item):
+                    item.remove(child)
+                self._fill_item(item, article_id, content, title, publish_date, author, now)
+                # 保持原有发布日期，避免条目在阅读器中重新排序
+                item.find('pubDate').text = old_pubdate
+                
+                hashes['articles'][str(article_id)] = new_hash
+                edited += 1
+                self.edited_article_ids.append(article_id)
+                logger.info(f"检测到文章内容更新: {title} (ID: {article_id})")
+            
+            if not self._write_if_changed(tree, channel, original_hash, hashes, now):
+                logger.info(f"最近{len(recent_ids)}篇文章没有内容变化")
+                return False
+            
+            logger.info(f"已更新{edited}篇内容变化的文章")
+            if self.auto_sync:
+                self._sync_to_git_repository()
+            return True
+        
+        except Exception as e:
+            logger.error(f"检查文章内容更新时出错: {str(e)}")
+            return False
+    
+    def _ensure_hub_links(self, channel):
+        """确保channel中包含rel="hub"和rel="self"的atom:link元素"""
+        for rel, href in (('hub', self.hub_url), ('self', self.self_url)):
+            if not href:
+                continue
+            
+            link_elem = None
+            for existing in channel.findall(f'{{{ATOM_NS}}}link'):
+                if existing.get('rel') == rel:
+                    link_elem = existing
+                    break
+            
+            if link_elem is None:
+                link_elem = ET.Element(f'{{{ATOM_NS}}}link', {'rel': rel})
+                # 放在第一个item之前，保持channel元信息在前
+                first_item = channel.find('item')
+                index = list(channel).index(first_item) if first_item is not None else len(channel)
+                if index > 0:
+                    link_elem.tail = channel[index - 1].tail
+                channel.insert(index, link_elem)
+            
+            link_elem.set('href', href)
+            if rel == 'self':
+                link_elem.set('type', 'application/rss+xml')
+    
+    def _ensure_ttl(self, channel):
+        """确保channel中的<ttl>与更新间隔一致"""
+        if not self.ttl:
+            return
+        
+        ttl_elem = channel.find('ttl')
+        if ttl_elem is None:
+            ttl_elem = ET.Element('ttl')
+            # 放在第一个item之前，保持channel元信息在前
+            first_item = channel.find('item')
+            index = list(channel).index(first_item) if first_item is not None else len(channel)
+            if index > 0:
+                ttl_elem.tail = channel[index - 1].tail
+            channel.insert(index, ttl_elem)
+        ttl_elem.text = str(int(self.ttl))
+    
     def _create_html_description(self, markdown_content, title, publish_date, author):
         """从Markdown内容创建HTML描述"""
         # 创建基本的HTML结构
@@ -241,6 +496,9 @@ class RSSUpdater:
                     img_parts = line.split('](', 1)
                     if len(img_parts) > 1:
                         img_url = img_parts[1].rstrip(')')
+                        # 已缓存的图片改为本地地址
+                        if self.image_cache:
+                            img_url = self.image_cache.local_url(img_url) or img_url
                         processed_line = f"<img src=\"{img_url}\" alt=\"图片\">"
                     else:
                         processed_line = f"<p>{line}</p>"
@@ -273,6 +531,9 @@ class RSSUpdater:
 
 # 如果直接运行此脚本
 if __name__ == "__main__":
+    from logging_config import configure_logging
+    configure_logging()
+    
     # 创建RSS更新器
     updater = RSSUpdater()
     
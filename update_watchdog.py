@@ -0,0 +1,168 @@
+import time
+import logging
+import threading
+from datetime import datetime
+
+logger = logging.getLogger('update_watchdog')
+
+# 各阶段的默认超时时间（秒）
+DEFAULT_STAGE_DEADLINES = {
+    'leader': 120,
+    'pull': 300,
+    'scrape': 900,
+    'images': 600,
+    'update': 300,
+    'push': 300,
+    'publish': 300,
+    'recheck': 600,
+}
+
+
+class StaleGenerationError(Exception):
+    """更新线程已被看门狗替换，不应继续执行有副作用的阶段"""
+
+
+class UpdateWatchdog:
+    """
+    RSS更新线程的看门狗：记录更新周期各阶段的心跳，阶段超时时判定线程卡死并重启更新线程，
+    同时为/health提供组件级别的存活状态
+    """
+    def __init__(self, sleep_interval, stage_deadlines=None, check_interval=30):
+        """
+        初始化看门狗
+
+        Args:
+            sleep_interval: 更新线程两次检查之间的休眠时间（秒），用作sleep阶段的超时基准
+            stage_deadlines: 各阶段超时时间，未指定的阶段使用默认值
+            check_interval: 看门狗检查间隔（秒）
+        """
+        self.stage_deadlines = dict(DEFAULT_STAGE_DEADLINES)
+        self.stage_deadlines['sleep'] = sleep_interval + 300
+        if stage_deadlines:
+            self.stage_deadlines.update(stage_deadlines)
+        self.check_interval = check_interval
+
+        self.lock = threading.Lock()
+        self.generation = 0
+        self.owner_thread = None  # 当前代更新线程的线程ID，只接受其心跳
+        self.restart_callback = None
+        self.is_running = False
+
+        self.stage = None
+        self.stage_started_at = None
+        self.cycle_started_at = None
+        self.last_success = {}  # 组件名 -> 最近一次成功时间
+        self.restart_count = 0
+
+    def new_generation(self):
+        """开始新一代更新线程，返回其代号；旧线程通过is_current得知自己已被替换"""
+        with self.lock:
+            self.generation += 1
+            self.stage = None
+            self.stage_started_at = None
+            self.cycle_started_at = None
+            return self.generation
+
+    def attach(self, generation):
+        """由更新线程调用，登记为当前代的心跳来源"""
+        with self.lock:
+            if generation == self.generation:
+                self.owner_thread = threading.get_ident()
+
+    def is_current(self, generation):
+        """判断更新线程是否仍为当前代"""
+        return generation == self.generation
+
+    def beat(self, stage):
+        """记录进入某个阶段的心跳"""
+        now = time.time()
+        with self.lock:
+            # 忽略已被替换的旧线程的心跳
+            if threading.get_ident() != self.owner_thread:
+                return
+            if stage != 'sleep' and self.cycle_started_at is None:
+                self.cycle_started_at = now
+            if stage == 'sleep':
+                self.cycle_started_at = None
+            self.stage = stage
+            self.stage_started_at = now
+
+    def enter(self, generation, stage):
+        """进入有副作用的阶段（写入feed、推送、通知等）前调用：记录心跳，
+        线程已被替换时抛出StaleGenerationError，避免与新一代线程重复推送或同时写入"""
+        if not self.is_current(generation):
+            raise StaleGenerationError(f"第{generation}代更新线程已被替换，放弃{stage}阶段")
+        self.beat(stage)
+
+    def record_success(self, component):
+        """记录某个组件（如scrape、push）最近一次成功的时间"""
+        with self.lock:
+            # 忽略已被替换的旧线程的成功记录
+            if threading.get_ident() != self.owner_thread:
+                return
+            self.last_success[component] = time.time()
+
+    def _overdue_stage(self):
+        """返回已超时的阶段及其耗时，没有超时时返回(None, 0)，调用方需持有锁"""
+        if self.stage is None or self.stage_started_at is None:
+            return None, 0
+        elapsed = time.time() - self.stage_started_at
+        deadline = self.stage_deadlines.get(self.stage)
+        if deadline is not None and elapsed > deadline:
+            return self.stage, elapsed
+        return None, 0
+
+    def start(self, restart_callback):
+        """
+        启动看门狗线程
+
+        Args:
+            restart_callback: 阶段超时时调用的函数，用于启动新的更新线程
+        """
+        if self.is_running:
+            return
+
+        self.is_running = True
+        self.restart_callback = restart_callback
+
+        def watchdog_worker():
+            while self.is_running:
+                time.sleep(self.check_interval)
+                with self.lock:
+                    stage, elapsed = self._overdue_stage()
+                if not stage:
+                    continue
+
+                logger.error(f"RSS更新线程在{stage}阶段卡住{int(elapsed)}秒，超过时限{self.stage_deadlines[stage]}秒，重启更新线程")
+                with self.lock:
+                    self.restart_count += 1
+                try:
+                    self.restart_callback()
+                except Exception as e:
+                    logger.error(f"重启RSS更新线程失败: {str(e)}")
+
+        watchdog_thread = threading.Thread(target=watchdog_worker, name='update-watchdog')
+        watchdog_thread.daemon = True
+        watchdog_thread.start()
+        logger.info(f"看门狗已启动，检查间隔: {self.check_interval}秒")
+
+    def status(self):
+        """返回组件级别的存活状态"""
+        now = time.time()
+        with self.lock:
+            overdue_stage, _ = self._overdue_stage()
+            components = {
+                component: {
+                    'last_success': datetime.fromtimestamp(ts).isoformat(),
+                    'age_seconds': int(now - ts)
+                }
+                for component, ts in self.last_success.items()
+            }
+            return {
+                'healthy': overdue_stage is None,
+                'stage': self.stage,
+                'stage_age_seconds': int(now - self.stage_started_at) if self.stage_started_at else None,
+                'cycle_age_seconds': int(now - self.cycle_started_at) if self.cycle_started_at else None,
+                'restart_count': self.restart_count,
+                'components': components
+            }
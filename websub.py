@@ -0,0 +1,282 @@
+import os
+import json
+import time
+import hmac
+import socket
+import ipaddress
+import hashlib
+import secrets
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+from flask import request
+
+logger = logging.getLogger('websub')
+
+
+class WebSubHub:
+    """
+    内置WebSub（PubSubHubbub）发布者和Hub，feed更新后主动推送给订阅者，减少轮询
+    """
+    def __init__(self, app, feed_path='feed.xml', subscriptions_path='websub_subscriptions.json',
+                 max_workers=8, max_retries=3, request_timeout=10, max_subscriptions=1000):
+        """
+        初始化WebSub Hub
+
+        Args:
+            app: Flask应用实例
+            feed_path: feed.xml文件路径
+            subscriptions_path: 订阅信息保存路径
+            max_workers: 推送时的最大并发数
+            max_retries: 每个订阅者的最大重试次数
+            request_timeout: 回调请求超时时间（秒）
+            max_subscriptions: 最多保存的订阅数量
+        """
+        self.app = app
+        self.feed_path = feed_path
+        self.subscriptions_path = subscriptions_path
+        self.max_retries = max_retries
+        self.request_timeout = request_timeout
+        self.max_subscriptions = max_subscriptions
+        self.default_lease_seconds = 10 * 86400
+        self.max_lease_seconds = 30 * 86400
+
+        service_url = os.environ.get('SERVICE_URL', 'http://localhost:5000').rstrip('/')
+        self.hub_url = f"{service_url}/websub"
+        self.topic_url = f"{service_url}/feed.xml"
+
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='websub')
+        self.subscriptions = self._load_subscriptions()
+
+    def _load_subscriptions(self):
+        """从文件加载订阅信息"""
+        if not os.path.exists(self.subscriptions_path):
+            return {}
+        try:
+            with open(self.subscriptions_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.error(f"加载WebSub订阅信息失败: {str(e)}")
+            return {}
+
+    def _save_subscriptions(self):
+        """保存订阅信息到文件，调用方需持有锁"""
+        tmp_path = f"{self.subscriptions_path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.subscriptions, f, ensure_ascii=False)
+            os.replace(tmp_path, self.subscriptions_path)
+        except Exception as e:
+            logger.error(f"保存WebSub订阅信息失败: {str(e)}")
+
+    def _is_public_callback(self, callback):
+        """回调地址的主机必须解析到公网地址，拒绝私有、回环、链路本地等地址，防止通过Hub访问内网服务"""
+        host = urlparse(callback).hostname
+        if not host:
+            return False
+        try:
+            addresses = socket.getaddrinfo(host, None, proto=socket.IPPROTO_TCP)
+        except (socket.gaierror, UnicodeError):
+            return False
+        for address in addresses:
+            ip = ipaddress.ip_address(address[4][0].split('%')[0])
+            # IPv4映射的IPv6地址按其中的IPv4地址判断
+            if ip.version == 6 and ip.ipv4_mapped:
+                ip = ip.ipv4_mapped
+            if not ip.is_global or ip.is_multicast:
+                return False
+        return bool(addresses)
+
+    def link_header(self):
+        """返回用于HTTP响应的Link头，向客户端声明Hub地址"""
+        return f'<{self.hub_url}>; rel="hub", <{self.topic_url}>; rel="self"'
+
+    def add_endpoints(self):
+        """
+        添加WebSub订阅端点到Flask应用
+        """
+        @self.app.route('/websub', methods=['POST'])
+        def websub_subscribe():
+            mode = request.form.get('hub.mode')
+            callback = request.form.get('hub.callback', '')
+            topic = request.form.get('hub.topic')
+
+            if mode not in ('subscribe', 'unsubscribe'):
+                return 'hub.mode必须为subscribe或unsubscribe', 400
+            if topic != self.topic_url:
+                return f'不支持的hub.topic，仅支持: {self.topic_url}', 400
+            if urlparse(callback).scheme not in ('http', 'https'):
+                return 'hub.callback必须为http(s) URL', 400
+            if not self._is_public_callback(callback):
+                return 'hub.callback必须解析到公网地址', 400
+            if mode == 'subscribe':
+                with self.lock:
+                    full = callback not in self.subscriptions and len(self.subscriptions) >= self.max_subscriptions
+                if full:
+                    return '订阅数量已达上限', 429
+
+            try:
+                lease_seconds = int(request.form.get('hub.lease_seconds', self.default_lease_seconds))
+            except ValueError:
+                lease_seconds = self.default_lease_seconds
+            lease_seconds = max(60, min(lease_seconds, self.max_lease_seconds))
+            secret = request.form.get('hub.secret')
+
+            # 异步验证订阅意图，立即返回202
+            self.executor.submit(self._verify_intent, mode, callback, lease_seconds, secret)
+            return '', 202
+
+    def _verify_intent(self, mode, callback, lease_seconds, secret):
+        """向订阅者回调地址发送验证请求，验证通过后更新订阅"""
+        import requests  # 延迟导入，缩短服务启动时间
+
+        challenge = secrets.token_urlsafe(24)
+        params = {
+            'hub.mode': mode,
+            'hub.topic': self.topic_url,
+            'hub.challenge': challenge,
+            'hub.lease_seconds': lease_seconds
+        }
+        try:
+            # 验证前再次检查地址，域名解析结果可能已经改变；不跟随重定向，避免被重定向到内网地址
+            if not self._is_public_callback(callback):
+                logger.warning(f"WebSub回调地址未解析到公网地址，拒绝订阅: {callback}")
+                return False
+            response = requests.get(callback, params=params, timeout=self.request_timeout,
+                                    allow_redirects=False)
+            if not (200 <= response.status_code < 300) or response.text.strip() != challenge:
+                logger.warning(f"WebSub订阅验证失败: {callback}，状态码: {response.status_code}")
+                return False
+        except Exception as e:
+            logger.warning(f"WebSub订阅验证异常: {callback}，错误: {str(e)}")
+            return False
+
+        with self.lock:
+            if mode == 'subscribe':
+                # 验证期间其他订阅可能已占满名额
+                if callback not in self.subscriptions and len(self.subscriptions) >= self.max_subscriptions:
+                    logger.warning(f"WebSub订阅数量已达上限({self.max_subscriptions})，拒绝订阅: {callback}")
+                    return False
+                self.subscriptions[callback] = {
+                    'expires_at': time.time() + lease_seconds,
+                    'secret': secret
+                }
+                logger.info(f"新增WebSub订阅: {callback}")
+            else:
+                self.subscriptions.pop(callback, None)
+                logger.info(f"取消WebSub订阅: {callback}")
+            self._save_subscriptions()
+        return True
+
+    def _active_subscriptions(self):
+        """清理过期订阅并返回有效订阅列表"""
+        now = time.time()
+        with self.lock:
+            expired = [cb for cb, sub in self.subscriptions.items() if sub.get('expires_at', 0) <= now]
+            for callback in expired:
+                del self.subscriptions[callback]
+            if expired:
+                logger.info(f"清理了{len(expired)}个过期的WebSub订阅")
+                self._save_subscriptions()
+            return list(self.subscriptions.items())
+
+    def _deliver(self, callback, subscription, content):
+        """向单个订阅者推送内容，失败时指数退避重试"""
+        import requests  # 延迟导入，缩短服务启动时间
+
+        headers = {
+            'Content-Type': 'application/rss+xml; charset=utf-8',
+            'Link': self.link_header()
+        }
+        if subscription.get('secret'):
+            signature = hmac.new(subscription['secret'].encode('utf-8'), content, hashlib.sha256).hexdigest()
+            headers['X-Hub-Signature'] = f"sha256={signature}"
+
+        if not self._is_public_callback(callback):
+            logger.warning(f"WebSub回调地址未解析到公网地址，跳过推送: {callback}")
+            return False
+
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                response = requests.post(callback, data=content, headers=headers, timeout=self.request_timeout,
+                                         allow_redirects=False)
+                if 200 <= response.status_code < 300:
+                    return True
+                if response.status_code == 410:
+                    # 订阅者已不存在，删除订阅
+                    with self.lock:
+                        self.subscriptions.pop(callback, None)
+                        self._save_subscriptions()
+                    logger.info(f"订阅者返回410，已删除订阅: {callback}")
+                    return False
+                logger.warning(f"WebSub推送失败: {callback}，状态码: {response.status_code}，第{attempt}次尝试")
+            except Exception as e:
+                logger.warning(f"WebSub推送异常: {callback}，错误: {str(e)}，第{attempt}次尝试")
+
+            if attempt < self.max_retries:
+                time.sleep(2 ** attempt)
+
+        return False
+
+    def feed_digest(self):
+        """返回当前feed.xml内容的SHA-256哈希，文件不存在时返回None"""
+        try:
+            with open(self.feed_path, 'rb') as f:
+                return hashlib.sha256(f.read()).hexdigest()
+        except FileNotFoundError:
+            return None
+
+    def publish(self):
+        """
+        读取最新feed.xml并提交给推送线程池，不等待推送完成，返回提交的订阅者数量
+
+        失效的订阅者每个最多需要数十秒（超时加退避重试），等待会阻塞更新线程并触发看门狗，
+        推送结果在全部完成后由回调记录日志
+        """
+        subscriptions = self._active_subscriptions()
+        if not subscriptions:
+            return 0
+
+        try:
+            with open(self.feed_path, 'rb') as f:
+                content = f.read()
+        except Exception as e:
+            logger.error(f"读取feed.xml失败，无法推送: {str(e)}")
+            return 0
+
+        total = len(subscriptions)
+        results = []
+        results_lock = threading.Lock()
+
+        def on_done(future):
+            with results_lock:
+                results.append(not future.exception() and future.result())
+                if len(results) < total:
+                    return
+                delivered = sum(1 for result in results if result)
+            logger.info(f"WebSub推送完成: {delivered}/{total}个订阅者成功")
+
+        for callback, subscription in subscriptions:
+            future = self.executor.submit(self._deliver, callback, subscription, content)
+            future.add_done_callback(on_done)
+        logger.info(f"已提交WebSub推送: {total}个订阅者")
+        return total
+
+
+def setup_websub(app, feed_path='feed.xml'):
+    """
+    设置WebSub Hub，在主应用中调用此函数
+
+    Args:
+        app: Flask应用实例
+        feed_path: feed.xml文件路径
+
+    Returns:
+        WebSubHub实例
+    """
+    hub = WebSubHub(app, feed_path=feed_path,
+                    max_subscriptions=int(os.environ.get('WEBSUB_MAX_SUBSCRIPTIONS', 1000)))
+    hub.add_endpoints()
+    return hub